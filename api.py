@@ -0,0 +1,219 @@
+import argparse
+import bisect
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date, datetime
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import serialize
+import store
+from event import DanceEvent
+
+# A small JSON API over the events, so that other services don't have to
+# download and filter the whole events.json:
+#
+#   GET /api/events?from=2024-03-01&to=2024-04-01&school=Chris&max_price=10&limit=20
+#
+# All parameters are optional, `from` defaults to today, `to` is exclusive
+# and `max_price` is in euro (events without a price are left out then).
+#
+# The events are kept in memory, sorted by their start (so a date range is
+# two binary searches) and once more per school. Every event is encoded to
+# JSON once when the index is built, a response only joins these fragments.
+# The crawler writes to the store and the API polls it, once there is a new
+# crawl a new index is built and swapped in as a whole.
+POLL_SECONDS = 5
+MAX_LIMIT = 1000
+
+
+@dataclass
+class Slice:
+    starts: list[datetime]
+    prices: list[int | None]
+    fragments: list[str]
+
+
+@dataclass
+class Index:
+    seq: int
+    day: date
+    all: Slice
+    schools: dict[str, Slice]
+
+    @property
+    def version(self) -> str:
+        return f"{self.seq}.{self.day:%Y%m%d}"
+
+
+def build_slice(events: list[DanceEvent]) -> Slice:
+    return Slice(
+        starts=[e.starts_at for e in events],
+        prices=[e.price_euro_cent for e in events],
+        fragments=[serialize.encode_event(e, compact=True) for e in events],
+    )
+
+
+def build_index(seq: int, day: date) -> Index:
+    events = store.events(start=datetime.combine(day, datetime.min.time()))
+
+    by_school: dict[str, list[DanceEvent]] = {}
+    for event in events:
+        by_school.setdefault(event.dancing_school.casefold(), []).append(event)
+
+    return Index(
+        seq=seq,
+        day=day,
+        all=build_slice(events),
+        schools={school: build_slice(e) for school, e in by_school.items()},
+    )
+
+
+_index: Index | None = None
+
+
+class BadRequest(ValueError):
+    pass
+
+
+# The events are in local time (without a timezone), so a time with a
+# timezone is converted to local time first.
+def parse_datetime(value: str) -> datetime:
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise BadRequest(f"invalid date: {value}") from None
+
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+
+def query(index: Index, parameters: dict[str, str]) -> str:
+    events = index.all
+    if "school" in parameters:
+        empty = Slice(starts=[], prices=[], fragments=[])
+        events = index.schools.get(parameters["school"].casefold(), empty)
+
+    start, end = 0, len(events.starts)
+    if "from" in parameters:
+        start = bisect.bisect_left(events.starts, parse_datetime(parameters["from"]))
+    if "to" in parameters:
+        end = bisect.bisect_left(events.starts, parse_datetime(parameters["to"]))
+
+    try:
+        max_price = (
+            round(float(parameters["max_price"]) * 100)
+            if "max_price" in parameters
+            else None
+        )
+        limit = min(int(parameters.get("limit", MAX_LIMIT)), MAX_LIMIT)
+    except (ValueError, OverflowError) as e:
+        raise BadRequest(str(e)) from None
+
+    fragments = []
+    for i in range(start, end):
+        if len(fragments) >= limit:
+            break
+        price = events.prices[i]
+        if max_price is not None and (price is None or price > max_price):
+            continue
+        fragments.append(events.fragments[i])
+
+    return (
+        f'{{"seq": {index.seq}, "count": {len(fragments)}, '
+        f'"events": [{", ".join(fragments)}]}}'
+    )
+
+
+class Handler(BaseHTTPRequestHandler):
+    server_version = "DanceTime"
+
+    def do_GET(self):
+        # Read it once, a new index might be swapped in meanwhile.
+        index = _index
+
+        url = urlsplit(self.path)
+        if url.path != "/api/events":
+            self.send_json(HTTPStatus.NOT_FOUND, '{"error": "not found"}')
+            return
+        if index is None:
+            self.send_json(HTTPStatus.SERVICE_UNAVAILABLE, '{"error": "no crawl yet"}')
+            return
+
+        parameters = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        query_hash = hashlib.sha1(repr(sorted(parameters.items())).encode())
+        etag = f'"{index.version}-{query_hash.hexdigest()[:12]}"'
+        if etag in self.headers.get("If-None-Match", ""):
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        try:
+            body = query(index, parameters)
+        except BadRequest as e:
+            self.send_json(HTTPStatus.BAD_REQUEST, json.dumps({"error": str(e)}))
+            return
+
+        self.send_json(HTTPStatus.OK, body, etag)
+
+    def send_json(self, status: HTTPStatus, body: str, etag: str | None = None):
+        data = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        if etag is not None:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# Rebuilds the index whenever there is a new crawl or the day changed (so
+# that past events drop out).
+def refresh():
+    global _index
+
+    seq, day = store.last_crawl(), date.today()
+    if _index is None or (_index.seq, _index.day) != (seq, day):
+        _index = build_index(seq, day)
+        print(f"Serving crawl {seq} with {len(_index.all.starts)} events.")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="DanceTime API", description="Serve the crawled events as a JSON API."
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=".cache",
+        help="folder in which the crawler keeps its state.",
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on.")
+    parser.add_argument("--port", type=int, default=8001, help="port to listen on.")
+    args = parser.parse_args()
+
+    os.makedirs(args.cache_dir, exist_ok=True)
+    store.configure(os.path.join(args.cache_dir, "events.sqlite3"))
+    refresh()
+
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Listening on http://{args.host}:{args.port}/api/events")
+
+    while True:
+        time.sleep(POLL_SECONDS)
+        refresh()
+
+
+if __name__ == "__main__":
+    main()
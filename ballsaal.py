@@ -1,14 +1,22 @@
-import concurrent.futures
+import asyncio
 import re
-from datetime import datetime
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING
 
-import dateparser
 import requests
-from bs4 import BeautifulSoup
-from dateutil.relativedelta import relativedelta
 
+import crawl
+import germandate
+import horizon
+import htmlparse
+import memo
+import stats
 from event import DanceEvent
 
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup
+
 
 def clean_name(name: str) -> str:
     # Some names start and end with a double quote for no reason
@@ -36,62 +44,100 @@ def clean_name(name: str) -> str:
     return name
 
 
+@dataclass
+class FineDetail:
+    ends_at: datetime
+    price_euro_cent: int | None
+    sold_out: bool
+
+
 # For the ends_at and price we need to do a second request to the ticketing website
 # because only there it says when the event will end. That is a bit of
 # work so we are doing it here in a separate function.
 # Unfortunately, there are two versions of the ticketing website so we need to branch
 # out into old and new here.
+async def add_fine_detail_async(event: DanceEvent) -> DanceEvent:
+    detail = memo.get(event.website)
+    if detail is None:
+        # A single slow or broken detail page shouldn't cost us all the other
+        # events, so in that case we just go without the details.
+        try:
+            response = await crawl.fetch(event.website)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            print(f"⚠️ No details for {event.website}: {e}")
+            stats.incr("detail_failures")
+            return event
+
+        detail = await crawl.parse(response, parse_fine_detail)
+        memo.put(event.website, detail, event.starts_at)
+
+    event.ends_at = detail.ends_at
+    # We don't parse the year so, the year it might assume, can be off by one.
+    while event.starts_at > event.ends_at:
+        event.ends_at += timedelta(days=1)
+
+    if detail.price_euro_cent is not None and (
+        event.price_euro_cent is None or event.price_euro_cent > detail.price_euro_cent
+    ):
+        event.price_euro_cent = detail.price_euro_cent
+
+    if detail.sold_out:
+        event.name += " [ausgebucht]"
+
+    return event
+
+
 def add_fine_detail(event: DanceEvent) -> DanceEvent:
-    response = requests.get(event.website, timeout=10)
-    response.raise_for_status()
-    html = response.text
+    return crawl.run(add_fine_detail_async(event))
+
 
-    soup = BeautifulSoup(html, "html.parser")
+# The detail pages come in two layouts (see below), these are the elements
+# either of them needs.
+DETAIL_CLASSES = ["event-start-time", "fw-bold", "end-date", "ticket-price-cell"]
+
+
+def parse_fine_detail(html: str) -> FineDetail:
+    soup = htmlparse.make_soup(html, classes=DETAIL_CLASSES)
     if soup.find("div", class_="event-start-time"):
-        return add_fine_detail_new(event, soup)
+        return parse_fine_detail_new(soup)
 
-    return add_fine_detail_old(event, soup)
+    return parse_fine_detail_old(soup)
 
 
-def add_fine_detail_new(event: DanceEvent, soup: BeautifulSoup) -> DanceEvent:
+def parse_fine_detail_new(soup: "BeautifulSoup") -> FineDetail:
     date_div = soup.find("div", class_="event-start-time")
     date_text: str = date_div.text.split("-")[-1].strip()
-    event.ends_at = dateparser.parse(date_text, languages=["de", "en"])
-
-    # We don't parse the year so, the year it might assume, can be off by one.
-    while event.starts_at > event.ends_at:
-        event.ends_at += relativedelta(days=1)
+    ends_at = germandate.parse(date_text)
 
     # There is no good way to find prices so let's get all text that have the
     # right class and contain a euro sign.
     price_divs = soup.findAll("div", class_="fw-bold")
     price_texts = [text for d in price_divs if "€" in (text := d.text)]
 
+    min_price = None
     for price_text in price_texts:
         m = re.search(r"(\d+),(\d{2}) €", price_text)
         if m is None:
             continue
         price = int(m.groups(0)[0]) * 100 + int(m.groups(0)[1])
 
-        if event.price_euro_cent is None or event.price_euro_cent > price:
-            event.price_euro_cent = price
+        if min_price is None or min_price > price:
+            min_price = price
 
     # FIXME: Figure out how "ausgebucht" works in the new UI once that case
     # actually occurs on the website.
 
-    return event
+    return FineDetail(ends_at=ends_at, price_euro_cent=min_price, sold_out=False)
 
 
-def add_fine_detail_old(event: DanceEvent, soup: BeautifulSoup) -> DanceEvent:
+def parse_fine_detail_old(soup: "BeautifulSoup") -> FineDetail:
     date_span = soup.find("span", class_="end-date")
     date_text = date_span.text
-    event.ends_at = dateparser.parse(date_text, languages=["de", "en"])
-
-    # We don't parse the year so, the year it might assume, can be off by one.
-    while event.starts_at > event.ends_at:
-        event.ends_at += relativedelta(days=1)
+    ends_at = germandate.parse(date_text)
 
     isAvailable = None
+    min_price = None
     price_items = soup.findAll(class_="ticket-price-cell")
 
     for price_item in price_items:
@@ -100,27 +146,21 @@ def add_fine_detail_old(event: DanceEvent, soup: BeautifulSoup) -> DanceEvent:
             continue
         price = int(m.groups(0)[0]) * 100 + int(m.groups(0)[1])
 
-        if event.price_euro_cent is None or event.price_euro_cent > price:
-            event.price_euro_cent = price
+        if min_price is None or min_price > price:
+            min_price = price
 
         if isAvailable is None or isAvailable == False:
             isAvailable = not ("Ausgebucht" in price_item.text)
 
-    if isAvailable is not None and not isAvailable:
-        event.name += " [ausgebucht]"
-
-    return event
-
-
-# For ballsaal.at we need to download and parse html. This is more tedious than
-# a JSON API but at least the format is very consistent.
-def download_ballsaal() -> list[DanceEvent]:
-    response = requests.get(
-        "https://www.ballsaal.at/termine_tickets/?no_cache=1", timeout=10
+    return FineDetail(
+        ends_at=ends_at,
+        price_euro_cent=min_price,
+        sold_out=isAvailable is not None and not isAvailable,
     )
-    response.raise_for_status()
 
-    soup = BeautifulSoup(response.text, features="html.parser")
+
+def parse_ballsaal(html: str) -> list[DanceEvent]:
+    soup = htmlparse.make_soup(html, classes=["event"])
     event_items = soup.find_all(class_="event")
 
     events = []
@@ -131,7 +171,7 @@ def download_ballsaal() -> list[DanceEvent]:
         date_string = " ".join(event.find(class_="date").text.split())
         url = event.find(class_="button")["href"]
 
-        date = datetime.strptime(date_string[4:], "%d.%m.%Y, %H:%M Uhr")
+        date = germandate.parse(date_string[4:])
         events.append(
             DanceEvent(
                 starts_at=date,
@@ -143,10 +183,21 @@ def download_ballsaal() -> list[DanceEvent]:
             )
         )
 
+    return events
+
+
+# For ballsaal.at we need to download and parse html. This is more tedious than
+# a JSON API but at least the format is very consistent.
+async def download_ballsaal_async() -> list[DanceEvent]:
+    response = await crawl.fetch("https://www.ballsaal.at/termine_tickets/?no_cache=1")
+    response.raise_for_status()
+
+    events = await crawl.parse(response, parse_ballsaal)
+    events = [e for e in events if horizon.includes(e.starts_at)]
+
     # Add the ends_at to each event event if
-    with concurrent.futures.ThreadPoolExecutor(
-        max_workers=max(1, len(events))
-    ) as executor:
-        events = list(executor.map(add_fine_detail, events))
+    return list(await asyncio.gather(*map(add_fine_detail_async, events)))
 
-    return events
+
+def download_ballsaal() -> list[DanceEvent]:
+    return crawl.run(download_ballsaal_async())
@@ -0,0 +1,352 @@
+import argparse
+import asyncio
+import functools
+import io
+import json
+import statistics
+import tempfile
+import time
+import tracemalloc
+import types
+from collections.abc import Callable
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import api
+import ballsaal
+import chris
+import crawl
+import htmlparse
+import ics
+import serialize
+from event import DanceEvent
+from main import (
+    MetaData,
+    configure_templates,
+    defaultconverter,
+    format_date,
+    format_price,
+    template_environment,
+)
+
+# Micro benchmarks for the hot paths of a crawl. They run on synthetic pages
+# that look like the real ones (a lot of navigation and markup around the few
+# elements we need), so they neither need the network nor change between
+# runs.
+#
+#   python benchmark.py [name ...]
+
+NOISE = (
+    '<nav class="navbar"><ul>'
+    + "".join(
+        f'<li class="nav-item"><a href="/{i}">Link {i}</a></li>' for i in range(60)
+    )
+    + "</ul></nav>"
+    + '<div class="container">'
+    + "".join(
+        f'<div class="row"><div class="col"><p>Absatz {i} mit <b>Text</b></p></div></div>'
+        for i in range(200)
+    )
+    + "</div>"
+)
+
+BALLSAAL_DETAIL = f"""<html><head><title>Ball</title></head><body>{NOISE}
+<div class="event-start-time">Sa. 19:30 - 23:00</div>
+<div class="fw-bold">Eintritt 25,00 €</div>
+<div class="fw-bold">Ermäßigt 18,50 €</div>
+<footer>{NOISE}</footer></body></html>"""
+
+CHRIS_EVENT = f"""<html><head><title>Perfektion</title></head><body>{NOISE}
+<div class="header"><h2>Perfektion</h2></div>
+<span class="news-list-date">21.01.2023</span>
+<span class="event-starttime">20:00</span><span class="event-endtime">22:00</span>
+<div class="news-text-wrap"><p>Üben, was man im Kurs gelernt hat.</p></div>
+<footer>{NOISE}</footer></body></html>"""
+
+
+SCHOOLS = ["Ballsaal", "Chris", "Dance4Fun", "Immervoll", "Rueff", "Strobl"]
+
+
+# A season worth of events from a couple of schools, every few hours one.
+def synthetic_events(count: int) -> list[DanceEvent]:
+    start = datetime.combine(date.today(), datetime.min.time())
+    return [
+        DanceEvent(
+            starts_at=start + timedelta(hours=5 * i),
+            ends_at=start + timedelta(hours=5 * i + 3),
+            name=f"Perfektion {i}" if i % 3 else f"Ball der Tänzer {i}",
+            price_euro_cent=None if i % 7 == 0 else 500 + 50 * (i % 20),
+            description="Standard, Latein und Boogie Woogie.\nMit Buffet & Bar.",
+            dancing_school=SCHOOLS[i % len(SCHOOLS)],
+            website=f"https://example.com/events/{i}",
+        )
+        for i in range(count)
+    ]
+
+
+def measure(fn: Callable, repeat: int) -> tuple[float, float]:
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return statistics.median(durations), peak
+
+
+def report(rows: list[tuple[str, float, float]]):
+    print(f"{'':<40} {'time':>10} {'peak memory':>12}")
+    for name, seconds, peak in rows:
+        print(f"{name:<40} {seconds * 1000:>8.3f}ms {peak / 1024:>10.0f}KB")
+
+
+# Building the whole tree versus only the elements a parser needs.
+def bench_html(repeat: int):
+    pages = [
+        ("ballsaal detail", BALLSAAL_DETAIL, ballsaal.DETAIL_CLASSES),
+        ("chris event", CHRIS_EVENT, chris.EVENT_CLASSES),
+    ]
+
+    rows = []
+    for backend in filter(htmlparse.available, htmlparse.BACKENDS):
+        htmlparse.configure(backend=backend)
+        for name, html, classes in pages:
+            full = functools.partial(htmlparse.make_soup, html)
+            strained = functools.partial(htmlparse.make_soup, html, classes=classes)
+            rows.append((f"{name} ({backend}, full)", *measure(full, repeat)))
+            rows.append((f"{name} ({backend}, strained)", *measure(strained, repeat)))
+    htmlparse.configure(backend="html.parser")
+
+    report(rows)
+
+
+# Parsing a growing number of Ballsaal detail pages at once in every parse
+# mode. The pools are warmed up first, as they are kept for the whole crawl.
+def bench_parse(repeat: int):
+    page = types.SimpleNamespace(text=BALLSAAL_DETAIL)
+
+    def parse_all(count: int):
+        async def run():
+            await asyncio.gather(
+                *(crawl.parse(page, ballsaal.parse_fine_detail) for _ in range(count))
+            )
+
+        asyncio.run(run())
+
+    modes = [m for m in crawl.PARSE_MODES if m != "auto"]
+    print(f"{crawl.PARSE_WORKERS} workers, free-threaded: {crawl.free_threaded()}")
+    print(f"{'pages':<8}" + "".join(f"{mode:>12}" for mode in modes))
+    for count in [1, 4, 16, 64]:
+        line = f"{count:<8}"
+        for mode in modes:
+            crawl.configure(parse_mode=mode)
+            parse_all(crawl.PARSE_WORKERS)
+            seconds, _ = measure(
+                functools.partial(parse_all, count), max(1, repeat // count)
+            )
+            line += f"{seconds * 1000:>10.1f}ms"
+        print(line)
+    crawl.configure(parse_mode="auto")
+
+
+# Typical queries against the in-memory index of the API.
+def bench_api(repeat: int):
+    events = synthetic_events(5000)
+    index = api.Index(
+        seq=1,
+        day=date.today(),
+        all=api.build_slice(events),
+        schools={
+            school.casefold(): api.build_slice(
+                [e for e in events if e.dancing_school == school]
+            )
+            for school in SCHOOLS
+        },
+    )
+    in_a_month = (date.today() + timedelta(days=30)).isoformat()
+    in_two_months = (date.today() + timedelta(days=60)).isoformat()
+    queries = {
+        "next 20": {"limit": "20"},
+        "one month": {"from": in_a_month, "to": in_two_months},
+        "school, one month": {
+            "school": "chris",
+            "from": in_a_month,
+            "to": in_two_months,
+        },
+        "max price, limit 50": {"max_price": "6", "limit": "50"},
+    }
+
+    rows = []
+    for name, parameters in queries.items():
+        fn = functools.partial(api.query, index, parameters)
+        rows.append((f"{name} (of {len(events)} events)", *measure(fn, repeat * 10)))
+    report(rows)
+
+
+# The old json.dump path for events.json against the own encoder. Unlike
+# json.dumps, json.dump into a file never uses the C encoder.
+def bench_json(repeat: int):
+    events = synthetic_events(5000)
+    header = {"seq": 1, "event_count": len(events), "error_messages": []}
+
+    cases = {
+        "json.dump(indent=2, default=...)": lambda: json.dump(
+            header | {"events": events},
+            io.StringIO(),
+            indent=2,
+            default=defaultconverter,
+        ),
+        "serialize, pretty": lambda: serialize.encode_document(header, events),
+        "serialize, compact": lambda: serialize.encode_document(
+            header, events, compact=True
+        ),
+        "serialize, ndjson": lambda: "".join(serialize.encode_ndjson(events)),
+    }
+
+    rows = [
+        (f"{name} ({len(events)} events)", *measure(fn, repeat))
+        for name, fn in cases.items()
+    ]
+    report(rows)
+
+
+# The old icalendar object tree for events.ics against the streaming writer.
+def bench_ics(repeat: int):
+    import icalendar
+
+    events = synthetic_events(5000)
+    stamp = datetime.now()
+
+    def with_icalendar():
+        cal = icalendar.Calendar()
+        cal.add("prodid", "-//DanceTime//flofriday//")
+        cal.add("version", "2.0")
+        for event in events:
+            ics_event = icalendar.Event()
+            ics_event.add("uid", event.key + "@dancetime.flofriday.dev")
+            ics_event.add("summary", event.name)
+            ics_event.add("dtstamp", stamp.replace(tzinfo=ZoneInfo("Europe/Vienna")))
+            ics_event.add(
+                "dtstart", event.starts_at.replace(tzinfo=ZoneInfo("Europe/Vienna"))
+            )
+            ics_event.add(
+                "dtend", event.ends_at.replace(tzinfo=ZoneInfo("Europe/Vienna"))
+            )
+            ics_event.add("location", event.dancing_school)
+            ics_event.add("description", event.description)
+            ics_event.add("x-alt-desc;fmttype=text/html", event.description)
+            cal.add_component(ics_event)
+        io.BytesIO().write(cal.to_ical())
+
+    def streaming():
+        f = io.StringIO()
+        f.writelines(
+            ics.calendar(
+                ics.vevent(
+                    [e], ics.details([e], e.description, e.description), stamp, 0
+                )
+                for e in events
+            )
+        )
+
+    cases = {"icalendar": with_icalendar, "ics (streaming)": streaming}
+    rows = [
+        (f"{name} ({len(events)} events)", *measure(fn, repeat))
+        for name, fn in cases.items()
+    ]
+    report(rows)
+
+
+# Rendering index.html: compiling the template every time and rendering it
+# into a string, against the shared environment (compiled once, or loaded
+# from the bytecode cache) streaming into the file.
+def bench_template(repeat: int):
+    from jinja2 import Template, select_autoescape
+
+    events = synthetic_events(5000)
+    metadata = MetaData(
+        count=len(events),
+        crawled_at=datetime.now(),
+        duration=timedelta(seconds=1),
+        error_messages=[],
+    )
+
+    def compile_and_render():
+        with open("template.html", encoding="utf-8") as template_html:
+            template = Template(
+                template_html.read(),
+                autoescape=select_autoescape(default_for_string=True),
+            )
+        # Like before, looking up the time for every event.
+        template.globals["format_date"] = lambda d, _: format_date(d, datetime.now())
+        template.globals["format_price"] = format_price
+        io.StringIO().write(
+            template.render(events=events, metadata=metadata, now=datetime.now())
+        )
+
+    def generate():
+        template = template_environment().get_template("template.html")
+        io.StringIO().writelines(
+            template.generate(events=events, metadata=metadata, now=datetime.now())
+        )
+
+    def load(cache_dir: str):
+        configure_templates(cache_dir)
+        template_environment().get_template("template.html")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        load(cache_dir)
+        rows = [
+            ("compile template", *measure(functools.partial(load, None), repeat)),
+            (
+                "load from bytecode cache",
+                *measure(functools.partial(load, cache_dir), repeat),
+            ),
+            (
+                f"compile + render ({len(events)} events)",
+                *measure(compile_and_render, repeat),
+            ),
+            (
+                f"environment + generate ({len(events)} events)",
+                *measure(generate, repeat),
+            ),
+        ]
+    configure_templates()
+    report(rows)
+
+
+BENCHMARKS = {
+    "html": bench_html,
+    "parse": bench_parse,
+    "api": bench_api,
+    "json": bench_json,
+    "ics": bench_ics,
+    "template": bench_template,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="benchmark.py", description="Run the DanceTime micro benchmarks."
+    )
+    parser.add_argument(
+        "names", nargs="*", choices=list(BENCHMARKS), help="benchmarks to run."
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=20, help="how often every case is measured."
+    )
+    args = parser.parse_args()
+
+    for name in args.names or BENCHMARKS:
+        print(f"# {name}")
+        BENCHMARKS[name](args.repeat)
+        print()
+
+
+if __name__ == "__main__":
+    main()
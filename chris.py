@@ -1,11 +1,14 @@
-import concurrent.futures
+import asyncio
 import re
-from datetime import datetime, timedelta
+from dataclasses import replace
+from datetime import datetime, time, timedelta
 
-import dateparser
 import requests
-from bs4 import BeautifulSoup
 
+import crawl
+import htmlparse
+import memo
+import stats
 from event import DanceEvent
 from holiday import holidays
 from timeutil import Weekday, weekly_event
@@ -27,8 +30,8 @@ def create_tanzcaffee() -> list[DanceEvent]:
         weekly_events = weekly_event(
             weekday,
             DanceEvent(
-                starts_at=dateparser.parse("17:00"),
-                ends_at=dateparser.parse("18:00"),
+                starts_at=time(17, 0),
+                ends_at=time(18, 0),
                 name="Tanzcafe",
                 price_euro_cent=500,
                 description="""Wehlistraße 150, 1020 Wien\n
@@ -62,11 +65,43 @@ def parse_time(text: str) -> tuple[int, int]:
         raise ValueError(f"Invalid time format: {text}")
 
 
+async def download_chris_event_async(url: str) -> DanceEvent | None:
+    event = memo.get(url)
+    if event is not None:
+        return replace(event)
+
+    # Like events without a starting time, we rather skip a single event than
+    # lose all of them because one page was slow or broken.
+    try:
+        response = await crawl.fetch(url)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        print(f"⚠️ Skipping {url}: {e}")
+        stats.incr("detail_failures")
+        return None
+
+    event = await crawl.parse(response, parse_chris_event, url)
+    if event is not None:
+        memo.put(url, replace(event), event.starts_at)
+    return event
+
+
 def download_chris_event(url: str) -> DanceEvent | None:
-    response = requests.get(url, timeout=10)
-    response.raise_for_status()
+    return crawl.run(download_chris_event_async(url))
+
+
+# The elements of an event page we actually need.
+EVENT_CLASSES = [
+    "news-list-date",
+    "event-starttime",
+    "event-endtime",
+    "header",
+    "news-text-wrap",
+]
 
-    soup = BeautifulSoup(response.text, features="html.parser")
+
+def parse_chris_event(html: str, url: str) -> DanceEvent | None:
+    soup = htmlparse.make_soup(html, classes=EVENT_CLASSES)
 
     base_date = datetime.strptime(
         soup.find(class_="news-list-date").text.strip(), "%d.%m.%Y"
@@ -102,32 +137,39 @@ def download_chris_event(url: str) -> DanceEvent | None:
     )
 
 
+def parse_chris_event_links(html: str) -> list[str]:
+    soup = htmlparse.make_soup(html, classes=["news-list-item"])
+    event_items = soup.find_all(class_="news-list-item")
+
+    return ["https://www.tanzschulechris.at" + e.find("a")["href"] for e in event_items]
+
+
 # We need to download and parse HTML for chris events. Unfortunately the
 # event overview doesn't have all the events information. So we first
 # need to gather the links for each individual event and then download them
 # separatly.
-def download_chris_events() -> list[DanceEvent | None]:
-    response = requests.get(
-        "https://www.tanzschulechris.at/perfektionen/tanzcafe_wien_1", timeout=10
+async def download_chris_events_async() -> list[DanceEvent | None]:
+    response = await crawl.fetch(
+        "https://www.tanzschulechris.at/perfektionen/tanzcafe_wien_1"
     )
     response.raise_for_status()
 
-    soup = BeautifulSoup(response.text, features="html.parser")
-    event_items = soup.find_all(class_="news-list-item")
+    event_links = await crawl.parse(response, parse_chris_event_links)
 
-    event_links = [
-        "https://www.tanzschulechris.at" + e.find("a")["href"] for e in event_items
-    ]
+    return list(await asyncio.gather(*map(download_chris_event_async, event_links)))
 
-    with concurrent.futures.ThreadPoolExecutor(
-        max_workers=max(1, len(event_links))
-    ) as executor:
-        events = list(executor.map(download_chris_event, event_links))
 
-    return events
+def download_chris_events() -> list[DanceEvent | None]:
+    return crawl.run(download_chris_events_async())
 
 
-def download_chris() -> list[DanceEvent]:
-    downloaded_events = [e for e in download_chris_events() if e is not None]
+async def download_chris_async() -> list[DanceEvent]:
+    downloaded_events = [
+        e for e in await download_chris_events_async() if e is not None
+    ]
     tanzcaffee_events = create_tanzcaffee()
     return downloaded_events + tanzcaffee_events
+
+
+def download_chris() -> list[DanceEvent]:
+    return crawl.run(download_chris_async())
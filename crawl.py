@@ -0,0 +1,248 @@
+import asyncio
+import concurrent.futures
+import functools
+import multiprocessing
+import os
+import sys
+import time
+import weakref
+from collections import deque
+from collections.abc import Callable, Coroutine
+from typing import Any
+from urllib.parse import urlsplit
+
+import requests
+
+import htmlparse
+import httpclient
+import stats
+
+# All downloaders are coroutines that run on one event loop, so that they can
+# fan out into detail pages and pagination without each starting their own
+# thread pool. The HTTP client itself is blocking, so the requests are
+# handed to a single shared pool of worker threads and at most
+# MAX_CONCURRENCY of them are in flight at once, no matter how many sources
+# and sub-requests are waiting.
+MAX_CONCURRENCY = 16
+
+_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=MAX_CONCURRENCY, thread_name_prefix="crawl"
+)
+
+# Semaphores are bound to the event loop they were first used on, and every
+# `run` creates a new loop.
+_semaphores: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore] = (
+    weakref.WeakKeyDictionary()
+)
+
+
+# Besides the global cap every host gets its own limit, which adapts to how the
+# host copes with the load: it grows slowly while responses come back fast
+# and is halved on timeouts, 429 and 5xx (AIMD, like TCP congestion control).
+# That way a fan-out into 30 detail pages doesn't hit one server all at once
+# and a struggling server gets some air instead of all requests timing out
+# together.
+HOST_INITIAL_LIMIT = 4
+HOST_MIN_LIMIT = 1
+HOST_SLOW_SECONDS = 2.0
+
+# Transient failures (timeouts, 429, 5xx) are retried with exponential backoff.
+RETRIES = 2
+RETRY_BACKOFF_SECONDS = 0.5
+
+# Parsing is CPU bound, so with the GIL the parsers on the threads only take
+# turns. PARSE_MODE decides where it happens:
+#   inline  - on the event loop itself, which blocks fetching meanwhile
+#   thread  - on a pool of threads, truly parallel on a free-threaded Python
+#   process - on a pool of processes, parallel with the GIL
+#   auto    - threads if there is no GIL (or only one CPU), otherwise processes
+# Counters incremented inside of a parser process are sent back with the
+# result (see stats.collect).
+PARSE_MODES = ["auto", "inline", "thread", "process"]
+PARSE_MODE = "auto"
+# There are only a few pages to parse per crawl and every process imports all
+# the parsers (and keeps running in the daemon), so a few are enough even on
+# a big host. process_cpu_count respects the CPUs we are pinned to.
+MAX_PARSE_WORKERS = 4
+PARSE_WORKERS = min(MAX_PARSE_WORKERS, os.process_cpu_count() or 1)
+
+_parse_threads: concurrent.futures.ThreadPoolExecutor | None = None
+_parse_processes: concurrent.futures.ProcessPoolExecutor | None = None
+
+
+class HostLimiter:
+    def __init__(self, initial: float, minimum: float, maximum: float):
+        self.limit = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.in_flight = 0
+        self._waiters: deque[asyncio.Future] = deque()
+
+    async def acquire(self):
+        while self.in_flight >= int(self.limit):
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                elif not waiter.cancelled():
+                    # We were woken up but won't take the slot, so pass it on.
+                    self._wake()
+                raise
+        self.in_flight += 1
+
+    def _wake(self):
+        free = int(self.limit) - self.in_flight
+        while self._waiters and free > 0:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+    # `ok` is None if the request neither succeeded nor failed because of the
+    # host (e.g. it was cancelled).
+    def release(self, ok: bool | None, elapsed: float):
+        self.in_flight -= 1
+
+        if ok is False:
+            self.limit = max(self.minimum, self.limit / 2)
+            stats.incr("host_backoffs")
+        elif ok and elapsed < HOST_SLOW_SECONDS:
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+        self._wake()
+
+
+_host_limiters: dict[str, HostLimiter] = {}
+
+
+def host_limiter(url: str) -> HostLimiter:
+    host = urlsplit(url).hostname or ""
+    if host not in _host_limiters:
+        _host_limiters[host] = HostLimiter(
+            initial=min(HOST_INITIAL_LIMIT, MAX_CONCURRENCY),
+            minimum=HOST_MIN_LIMIT,
+            maximum=MAX_CONCURRENCY,
+        )
+    return _host_limiters[host]
+
+
+def configure(max_concurrency: int | None = None, parse_mode: str | None = None):
+    global MAX_CONCURRENCY, PARSE_MODE, _executor
+
+    if max_concurrency is not None:
+        MAX_CONCURRENCY = max_concurrency
+        _executor.shutdown(wait=False)
+        _executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=MAX_CONCURRENCY, thread_name_prefix="crawl"
+        )
+        _semaphores.clear()
+        _host_limiters.clear()
+
+    if parse_mode is not None:
+        PARSE_MODE = parse_mode
+
+
+def _semaphore() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    if loop not in _semaphores:
+        _semaphores[loop] = asyncio.Semaphore(MAX_CONCURRENCY)
+    return _semaphores[loop]
+
+
+async def to_thread(fn: Callable, *args, **kwargs) -> Any:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+
+
+def _is_overloaded(response: requests.Response) -> bool:
+    return response.status_code == 429 or response.status_code >= 500
+
+
+async def fetch(url: str, **kwargs) -> requests.Response:
+    limiter = host_limiter(url)
+
+    for attempt in range(RETRIES + 1):
+        await limiter.acquire()
+        started = time.monotonic()
+        ok = None
+        try:
+            async with _semaphore():
+                response = await to_thread(httpclient.get, url, **kwargs)
+            ok = not _is_overloaded(response)
+        except (requests.Timeout, requests.ConnectionError):
+            ok = False
+            if attempt == RETRIES:
+                raise
+        finally:
+            limiter.release(ok, time.monotonic() - started)
+
+        if ok or attempt == RETRIES:
+            return response
+
+        stats.incr("retries")
+        await asyncio.sleep(RETRY_BACKOFF_SECONDS * 2**attempt)
+
+
+def free_threaded() -> bool:
+    return not getattr(sys, "_is_gil_enabled", lambda: True)()
+
+
+def parse_mode() -> str:
+    if PARSE_MODE != "auto":
+        return PARSE_MODE
+    if free_threaded() or PARSE_WORKERS == 1:
+        return "thread"
+    return "process"
+
+
+# The pools are only started once they are needed and then kept, as starting
+# the processes (and importing the parsers in there) is quite expensive.
+# By then the crawl already runs threads, so the processes are started by a
+# forkserver instead of forking this process, which could deadlock.
+def _parse_pools() -> tuple[
+    concurrent.futures.ThreadPoolExecutor, concurrent.futures.ProcessPoolExecutor
+]:
+    global _parse_threads, _parse_processes
+
+    if _parse_threads is None:
+        _parse_threads = concurrent.futures.ThreadPoolExecutor(
+            max_workers=PARSE_WORKERS, thread_name_prefix="parse"
+        )
+    if _parse_processes is None and parse_mode() == "process":
+        _parse_processes = concurrent.futures.ProcessPoolExecutor(
+            max_workers=PARSE_WORKERS,
+            mp_context=multiprocessing.get_context("forkserver"),
+            initializer=htmlparse.configure,
+            initargs=(htmlparse.BACKEND,),
+        )
+    return _parse_threads, _parse_processes
+
+
+# Like `httpclient.parse` but runs the parser according to PARSE_MODE. Cache
+# lookups stay in this process, only the parser itself is sent to another
+# one.
+async def parse(response: requests.Response, fn: Callable, *args) -> Any:
+    mode = parse_mode()
+    if mode == "inline":
+        return httpclient.parse(response, fn, *args)
+
+    threads, processes = _parse_pools()
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        threads,
+        functools.partial(
+            httpclient.parse,
+            response,
+            fn,
+            *args,
+            executor=processes if mode == "process" else None,
+        ),
+    )
+
+
+# Entry point for the synchronous wrappers of the downloaders.
+def run(coro: Coroutine) -> Any:
+    return asyncio.run(coro)
@@ -1,21 +1,33 @@
-import concurrent.futures
-from datetime import datetime
+import asyncio
+from dataclasses import dataclass
+from datetime import date, datetime
 
 import requests
 
+import crawl
+import horizon
+import stats
 from event import DanceEvent
 
+# The API is paginated by day, so page 0 is today, page 1 is tomorrow and so
+# on. The last page we need is the one of the last day before the horizon,
+# unless the listing ends before that.
+
+
+@dataclass
+class Page:
+    events: list[DanceEvent]
+    # The listing ended or the day of the page is already after the horizon.
+    beyond: bool
+    # Why the page couldn't be downloaded, if it couldn't.
+    error: Exception | None = None
+
 
 def parse_datetimes(date: str, time: str) -> datetime:
     return datetime.strptime(f"{date} {time}", "%Y-%m-%d %H:%M")
 
 
-def download_dance4fun_page(page: int) -> list[DanceEvent]:
-    url = f"https://retro.danceforfun.at/termine.php?page={page}"
-    response = requests.get(url, timeout=10)
-    response.raise_for_status()
-    data = response.json()
-
+def parse_dance4fun_page(data: dict) -> list[DanceEvent]:
     events = []
     if not data.get("data"):
         return events
@@ -44,24 +56,89 @@ def download_dance4fun_page(page: int) -> list[DanceEvent]:
     return events
 
 
+async def download_dance4fun_page_async(page: int) -> Page:
+    url = f"https://retro.danceforfun.at/termine.php?page={page}"
+    try:
+        response = await crawl.fetch(url)
+        response.raise_for_status()
+        data = response.json()
+    except (requests.RequestException, ValueError) as e:
+        # A single broken day shouldn't cost us all the others.
+        print(f"⚠️ Skipping {url}: {e}")
+        stats.incr("dance4fun_page_failures")
+        return Page(events=[], beyond=False, error=e)
+
+    # A day without events still has its day (`tag`), only pages after the
+    # end of the listing don't.
+    if not data.get("tag"):
+        return Page(events=[], beyond=True)
+
+    day = date.fromisoformat(data["tag"])
+    return Page(
+        events=parse_dance4fun_page(data),
+        beyond=day >= horizon.end().date(),
+    )
+
+
+def download_dance4fun_page(page: int) -> Page:
+    return crawl.run(download_dance4fun_page_async(page))
+
+
+# If every page we tried failed, the API is down and the events of the last
+# crawl are better than none at all.
+def _check_failures(pages: dict[int, Page]):
+    errors = [page.error for page in pages.values()]
+    if all(error is not None for error in errors):
+        raise errors[0]
+
+
+# Instead of blindly downloading every page up to the horizon we first search
+# for the last page that is still useful: probe exponentially growing page
+# numbers (all at once) and then bisect between the last useful and the first
+# useless probe. Only then are all the pages up to that one downloaded.
+async def download_dance4fun_async() -> list[DanceEvent]:
+    pages: dict[int, Page] = {}
+    last_page = horizon.DAYS - 1
+    if last_page < 0:
+        return []
+
+    async def download(numbers: list[int]):
+        numbers = [n for n in numbers if n not in pages]
+        results = await asyncio.gather(*map(download_dance4fun_page_async, numbers))
+        pages.update(zip(numbers, results, strict=True))
+
+    probes = sorted({0, last_page} | {2**i for i in range(last_page.bit_length())})
+    await download(probes)
+    _check_failures(pages)
+
+    last = last_page
+    beyond = [p for p in probes if pages[p].beyond]
+    if beyond:
+        # Pages that failed don't tell us anything, so they count as useful.
+        high = min(beyond)
+        low = max((p for p in probes if p < high), default=-1)
+        while high - low > 1:
+            middle = (low + high) // 2
+            await download([middle])
+            if pages[middle].beyond:
+                high = middle
+            else:
+                low = middle
+        last = low
+
+    await download(list(range(last + 1)))
+    _check_failures(pages)
+
+    stats.incr("dance4fun_pages_fetched", len(pages))
+    stats.incr("dance4fun_pages_skipped", max(0, horizon.DAYS - len(pages)))
+
+    return [
+        event
+        for number, page in sorted(pages.items())
+        if number <= last
+        for event in page.events
+    ]
+
+
 def download_dance4fun() -> list[DanceEvent]:
-    max_pages = 100  # Adjust this value if we want less events FIXME
-
-    with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-        future_to_page = {
-            executor.submit(download_dance4fun_page, page): page
-            for page in range(max_pages)
-        }
-        all_events = []
-
-        for future in concurrent.futures.as_completed(future_to_page):
-            page = future_to_page[future]
-            try:
-                events = future.result()
-                all_events.extend(events)
-                if page >= max_pages - 1:
-                    break
-            except Exception:
-                pass
-
-    return all_events
+    return crawl.run(download_dance4fun_async())
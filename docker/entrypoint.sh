@@ -1,8 +1,7 @@
 #!/bin/sh
 set -e
 
-# Seed the output directory so nginx has something to serve before
-# supercronic's first scheduled run at the top of the next hour.
-uv run main.py --output /app/dist
-
+# No blocking crawl here: the daemon started by supervisord first renders the
+# snapshot of the last crawl from the volume (if there is one), so nginx has
+# something to serve within a second, and then refreshes in the background.
 exec supervisord -c /etc/supervisord.conf
@@ -1,4 +1,4 @@
-import dateparser
+from datetime import time
 
 from event import DanceEvent
 from timeutil import Weekday, weekly_event
@@ -17,8 +17,8 @@ def create_perfections() -> list[DanceEvent]:
         events += weekly_event(
             weekday,
             DanceEvent(
-                starts_at=dateparser.parse("20:15"),
-                ends_at=dateparser.parse("22:15"),
+                starts_at=time(20, 15),
+                ends_at=time(22, 15),
                 name="Perfektion",
                 price_euro_cent=700,
                 description="Favoritenstraße 20, 1040 Wien\nFreitagsperfektion TanzZeit\nIm Dorner Club inkludiert I Dorner Schüler:innen € 5,-- I Gäste € 7,-",
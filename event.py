@@ -1,5 +1,8 @@
+import hashlib
+import re
 from dataclasses import dataclass
 from datetime import datetime
+from functools import lru_cache
 
 
 @dataclass
@@ -11,3 +14,32 @@ class DanceEvent:
     dancing_school: str
     website: str
     ends_at: datetime | None = None
+    # The iCalendar RRULE of the series the event belongs to (without its
+    # start and end), e.g. "FREQ=WEEKLY;BYDAY=FR".
+    recurrence: str | None = None
+
+    # Identifies the event across crawls, as long as the school, the start
+    # and the name stay the same. Small changes to the name like whitespace,
+    # case or a "[ausgebucht]" suffix don't count.
+    @property
+    def key(self) -> str:
+        # YYYYMMDDTHHMM, isoformat is a lot faster than strftime.
+        start = self.starts_at.isoformat(timespec="minutes")
+        start = start.replace("-", "").replace(":", "")
+        return f"{slug(self.dancing_school)}-{start}-{_name_digest(self.name)}"
+
+
+NON_ALPHANUMERIC = re.compile(r"[^a-z0-9]+")
+BRACKETS = re.compile(r"\[[^\]]*\]")
+
+
+# There are only a few schools and names, but many events.
+@lru_cache(maxsize=256)
+def slug(school: str) -> str:
+    return NON_ALPHANUMERIC.sub("-", school.lower()).strip("-")
+
+
+@lru_cache(maxsize=4096)
+def _name_digest(name: str) -> str:
+    name = " ".join(BRACKETS.sub("", name).casefold().split())
+    return hashlib.sha1(name.encode()).hexdigest()[:10]
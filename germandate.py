@@ -0,0 +1,149 @@
+import re
+from datetime import date, datetime
+from functools import lru_cache
+
+import stats
+
+# dateparser can read almost anything, but that makes it slow to import and
+# slow to call. The websites we crawl only use a handful of formats, so we
+# parse those ourselves and only fall back to dateparser if we don't
+# recognize the text (which is counted, so we notice new formats).
+#
+# Supported formats (all with an optional weekday in front and an optional
+# "Uhr" at the end):
+#   18.Dezember 2022, 18. Dezember 2022 / 10:00
+#   21.01.2023, 21.01.2023 19:30, 21.01.2023, 19:30 Uhr, 21.01.
+#   19:30 (today at that time)
+
+MONTHS = {
+    "jänner": 1,
+    "januar": 1,
+    "january": 1,
+    "jan": 1,
+    "feber": 2,
+    "februar": 2,
+    "february": 2,
+    "feb": 2,
+    "märz": 3,
+    "march": 3,
+    "mär": 3,
+    "mrz": 3,
+    "mar": 3,
+    "april": 4,
+    "apr": 4,
+    "mai": 5,
+    "may": 5,
+    "juni": 6,
+    "june": 6,
+    "jun": 6,
+    "juli": 7,
+    "july": 7,
+    "jul": 7,
+    "august": 8,
+    "aug": 8,
+    "september": 9,
+    "sept": 9,
+    "sep": 9,
+    "oktober": 10,
+    "october": 10,
+    "okt": 10,
+    "oct": 10,
+    "november": 11,
+    "nov": 11,
+    "dezember": 12,
+    "december": 12,
+    "dez": 12,
+    "dec": 12,
+}
+
+_WEEKDAY = r"(?:[^\W\d_]+\.?,?\s*)?"
+_TIME = r"(?:\s*[,/]?\s*(?P<hour>\d{1,2})[:.](?P<minute>\d{2}))?"
+_UHR = r"\s*(?:Uhr)?"
+
+NUMERIC_DATE = re.compile(
+    _WEEKDAY
+    + r"(?P<day>\d{1,2})\.\s*(?P<month>\d{1,2})\.\s*(?P<year>\d{4}|\d{2})?"
+    + _TIME
+    + _UHR,
+    re.IGNORECASE,
+)
+NAMED_DATE = re.compile(
+    _WEEKDAY
+    + r"(?P<day>\d{1,2})\.\s*(?P<month>[^\W\d_]+)\.?\s*(?P<year>\d{4})?"
+    + _TIME
+    + _UHR,
+    re.IGNORECASE,
+)
+TIME_ONLY = re.compile(r"(?P<hour>\d{1,2})[:.](?P<minute>\d{2})" + _UHR, re.IGNORECASE)
+RANGE = re.compile(
+    r"(?P<start>.*?\d{1,2}[:.]\d{2})\s*(?:Uhr)?\s*[-–]\s*(?P<end>\d{1,2}[:.]\d{2})"
+    + _UHR,
+    re.IGNORECASE,
+)
+
+
+def _build(today: date, match: re.Match, month: int) -> datetime | None:
+    year = match["year"]
+    if year is None:
+        year = today.year
+    elif len(year) == 2:
+        year = 2000 + int(year)
+
+    try:
+        return datetime(
+            int(year),
+            month,
+            int(match["day"]),
+            int(match["hour"] or 0),
+            int(match["minute"] or 0),
+        )
+    except ValueError:
+        return None
+
+
+# The result depends on the day for texts without a date (or a year), so the
+# day is part of the key.
+@lru_cache(maxsize=4096)
+def _parse(text: str, today: date) -> datetime | None:
+    if match := NUMERIC_DATE.fullmatch(text):
+        return _build(today, match, int(match["month"]))
+
+    if (match := NAMED_DATE.fullmatch(text)) and (
+        month := MONTHS.get(match["month"].lower())
+    ):
+        return _build(today, match, month)
+
+    if match := TIME_ONLY.fullmatch(text):
+        return datetime.combine(today, datetime.min.time()).replace(
+            hour=int(match["hour"]), minute=int(match["minute"])
+        )
+
+    return None
+
+
+def parse(text: str) -> datetime | None:
+    text = " ".join(text.split())
+    result = _parse(text, date.today())
+    if result is not None:
+        return result
+
+    stats.incr("dateparser_fallbacks")
+    import dateparser
+
+    return dateparser.parse(text, languages=["de", "en"])
+
+
+# Parses ranges like `Samstag, 21.01.2023 19:30 - 22:15 Uhr`, where the end
+# is on the same day as the start.
+def parse_range(text: str) -> tuple[datetime, datetime] | None:
+    match = RANGE.search(" ".join(text.split()))
+    if match is None:
+        return None
+
+    starts_at = parse(match["start"])
+    end = TIME_ONLY.fullmatch(match["end"])
+    if starts_at is None or end is None:
+        return None
+
+    ends_at = starts_at.replace(hour=int(end["hour"]), minute=int(end["minute"]))
+    return starts_at, ends_at
@@ -1,6 +1,8 @@
 import csv
-from datetime import date, timedelta
-from functools import cache
+from datetime import date
+from functools import cache, lru_cache
+
+import horizon
 
 
 # Get all holydays from the official federal list from:
@@ -9,15 +11,21 @@ from functools import cache
 # but since the csv includes dates for the next 10 years I think we will be
 # good. Also the webscraping will break much faster than this.
 @cache
-def holidays() -> set[date]:
+def all_holidays() -> frozenset[date]:
     with open("holiday.csv", encoding="utf-8") as f:
         reader = csv.DictReader(f)
 
-        return {
-            day
-            for row in reader
-            if row["TYP"] == "HF"
-            and date.today()
-            < (day := date.fromisoformat(row["DATUM"]))
-            < (date.today() + timedelta(days=365))
-        }
+        return frozenset(
+            date.fromisoformat(row["DATUM"]) for row in reader if row["TYP"] == "HF"
+        )
+
+
+# Cached per day and horizon, so that a long running process doesn't keep
+# using the holidays of the day it was started on.
+@lru_cache(maxsize=8)
+def holidays_between(start: date, end: date) -> set[date]:
+    return {day for day in all_holidays() if start < day < end}
+
+
+def holidays() -> set[date]:
+    return holidays_between(date.today(), horizon.end().date())
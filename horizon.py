@@ -0,0 +1,20 @@
+from datetime import datetime, timedelta
+
+# How far into the future we look. Every downloader and every generator of
+# recurring events stops at the horizon, so the cost of a crawl scales with
+# it: a short horizon makes for a cheap crawl that can run often.
+DAYS = 63
+
+
+def set_days(days: int):
+    global DAYS
+    DAYS = days
+
+
+def end() -> datetime:
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    return today + timedelta(days=DAYS)
+
+
+def includes(event_start: datetime) -> bool:
+    return event_start < end()
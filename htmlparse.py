@@ -0,0 +1,59 @@
+import importlib.util
+from collections.abc import Iterable
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup
+
+# All HTML goes through here, so that the parser BeautifulSoup uses can be
+# chosen in one place. html.parser ships with Python, lxml is a lot faster
+# and html5lib is the most lenient (and slowest) one.
+BACKENDS = ["html.parser", "lxml", "html5lib"]
+BACKEND = "html.parser"
+
+
+def available(backend: str) -> bool:
+    if backend == "html.parser":
+        return True
+    return importlib.util.find_spec(backend) is not None
+
+
+def configure(backend: str | None = None):
+    global BACKEND
+
+    if backend is not None:
+        BACKEND = backend
+
+
+def _has_class(classes: frozenset[str]):
+    # While parsing, bs4 hands us the raw attribute, so `class="a b"` is still
+    # the single string "a b" and a plain `class_=` filter would miss it.
+    def match(value: str | list[str] | None) -> bool:
+        if value is None:
+            return False
+        if isinstance(value, str):
+            value = value.split()
+        return not classes.isdisjoint(value)
+
+    return match
+
+
+# Most pages are only needed for a handful of elements, so instead of building
+# the whole tree we can restrict it to the elements with the given tag names
+# and/or classes (and everything inside of them). html5lib doesn't support
+# that and always builds the whole tree.
+def make_soup(
+    html: str,
+    tags: Iterable[str] | None = None,
+    classes: Iterable[str] | None = None,
+) -> "BeautifulSoup":
+    from bs4 import BeautifulSoup, SoupStrainer
+
+    parse_only = None
+    if (tags or classes) and BACKEND != "html5lib":
+        parse_only = SoupStrainer(
+            name=list(tags) if tags else None,
+            class_=_has_class(frozenset(classes)) if classes else None,
+        )
+
+    return BeautifulSoup(html, features=BACKEND, parse_only=parse_only)
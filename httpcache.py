@@ -0,0 +1,155 @@
+import contextlib
+import hashlib
+import importlib
+import json
+import os
+import pickle
+import tempfile
+import time
+from collections.abc import Callable
+from functools import cache
+
+import requests
+
+import stats
+
+# Most of the pages we crawl change only a few times a month, so we keep every
+# body together with its validators (ETag / Last-Modified) on disk. The next
+# request becomes a conditional one and on a 304 we can just reuse the body
+# from disk.
+# On top of that the parsed results are stored keyed by the body, so that an
+# unchanged page doesn't even need to go through BeautifulSoup again.
+
+MAX_AGE_DAYS = 30
+
+
+def _write_atomic(path: str, data: bytes):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp_path)
+        raise
+
+
+# A changed parser must not return stale results from the cache, so the source
+# of the module the parser lives in is part of the key, and so are the
+# modules every parser builds on (parsing dates and HTML, the events).
+PARSER_DEPENDENCIES = ["germandate", "htmlparse", "event"]
+
+
+@cache
+def _module_fingerprint(module_name: str) -> bytes:
+    digest = hashlib.sha256()
+    for name in [module_name, *PARSER_DEPENDENCIES]:
+        with open(importlib.import_module(name).__file__, "rb") as f:
+            digest.update(f.read())
+    return digest.digest()
+
+
+class HttpCache:
+    def __init__(self, folder: str):
+        self.folder = folder
+        self.http_folder = os.path.join(folder, "http")
+        self.parsed_folder = os.path.join(folder, "parsed")
+        os.makedirs(self.http_folder, exist_ok=True)
+        os.makedirs(self.parsed_folder, exist_ok=True)
+
+    def _http_path(self, url: str) -> str:
+        key = hashlib.sha256(url.encode()).hexdigest()
+        return os.path.join(self.http_folder, key)
+
+    def lookup(self, url: str) -> dict | None:
+        path = self._http_path(url)
+        try:
+            with open(path + ".json", encoding="utf-8") as f:
+                entry = json.load(f)
+            with open(path + ".body", "rb") as f:
+                entry["body"] = f.read()
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        return entry
+
+    def validators(self, entry: dict | None) -> dict[str, str]:
+        headers = {}
+        if entry is None:
+            return headers
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def store(self, url: str, response: requests.Response):
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if etag is None and last_modified is None:
+            # Without validators we could never revalidate the body.
+            return
+
+        path = self._http_path(url)
+        _write_atomic(path + ".body", response.content)
+        entry = {
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "encoding": response.encoding,
+        }
+        _write_atomic(path + ".json", json.dumps(entry).encode())
+
+    def revive(self, entry: dict, response: requests.Response) -> requests.Response:
+        # Turn the 304 into the 200 we got the last time.
+        path = self._http_path(entry["url"])
+        with contextlib.suppress(FileNotFoundError):
+            os.utime(path + ".json")
+            os.utime(path + ".body")
+
+        response.status_code = 200
+        response._content = entry["body"]
+        response.encoding = entry["encoding"]
+        return response
+
+    # `compute` does the actual call of `fn` on a miss, e.g. in another process.
+    def parsed(
+        self,
+        fn: Callable,
+        text: str,
+        *args,
+        variant: str = "",
+        compute: Callable | None = None,
+    ):
+        digest = hashlib.sha256()
+        digest.update(f"{fn.__module__}.{fn.__qualname__}".encode())
+        digest.update(_module_fingerprint(fn.__module__))
+        digest.update(variant.encode())
+        digest.update(repr(args).encode())
+        digest.update(text.encode())
+        path = os.path.join(self.parsed_folder, digest.hexdigest() + ".pickle")
+
+        try:
+            with open(path, "rb") as f:
+                result = pickle.load(f)
+            os.utime(path)
+            stats.incr("parse_cache_hits")
+            return result
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            pass
+
+        stats.incr("parse_cache_misses")
+        result = (compute or fn)(text, *args)
+        _write_atomic(path, pickle.dumps(result))
+        return result
+
+    # Entries that weren't used for a while belong to pages (or page versions)
+    # that don't exist anymore.
+    def prune(self, max_age_days: int = MAX_AGE_DAYS):
+        cutoff = time.time() - max_age_days * 24 * 60 * 60
+        for folder in [self.http_folder, self.parsed_folder]:
+            for entry in os.scandir(folder):
+                if entry.stat().st_mtime < cutoff:
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(entry.path)
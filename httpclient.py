@@ -0,0 +1,116 @@
+import concurrent.futures
+import threading
+from collections.abc import Callable
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import htmlparse
+import stats
+from httpcache import HttpCache
+
+# All downloaders share a single session so that connections are kept alive
+# and reused. Without this every detail page of Ballsaal and Chris and every
+# Dance4Fun page would pay for a new TCP and TLS handshake.
+# The underlying urllib3 pool manager keeps one pool per host, so
+# `pool_connections` is the number of hosts we keep pools for and
+# `pool_maxsize` the number of connections we keep open to each host.
+POOL_CONNECTIONS = 16
+POOL_MAXSIZE = 16
+TIMEOUT = 10
+HEADERS = {
+    "User-Agent": "DanceTime (+https://github.com/flofriday/dancetime)",
+    "Accept-Language": "de-AT,de;q=0.9,en;q=0.8",
+}
+
+_session: requests.Session | None = None
+_cache: HttpCache | None = None
+_lock = threading.Lock()
+
+
+def configure(
+    pool_connections: int | None = None,
+    pool_maxsize: int | None = None,
+    timeout: float | None = None,
+    headers: dict[str, str] | None = None,
+    cache_dir: str | None = None,
+):
+    global POOL_CONNECTIONS, POOL_MAXSIZE, TIMEOUT, _session, _cache
+
+    with _lock:
+        if pool_connections is not None:
+            POOL_CONNECTIONS = pool_connections
+        if pool_maxsize is not None:
+            POOL_MAXSIZE = pool_maxsize
+        if timeout is not None:
+            TIMEOUT = timeout
+        if headers is not None:
+            HEADERS.update(headers)
+        if cache_dir is not None:
+            _cache = HttpCache(cache_dir)
+            _cache.prune()
+
+        # Drop the old session so the next request picks up the new settings.
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def session() -> requests.Session:
+    global _session
+
+    with _lock:
+        if _session is None:
+            _session = requests.Session()
+            _session.headers.update(HEADERS)
+            adapter = HTTPAdapter(
+                pool_connections=POOL_CONNECTIONS,
+                pool_maxsize=POOL_MAXSIZE,
+            )
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    kwargs.setdefault("timeout", TIMEOUT)
+    if _cache is None:
+        return session().get(url, **kwargs)
+
+    entry = _cache.lookup(url)
+    headers = _cache.validators(entry) | kwargs.pop("headers", {})
+    response = session().get(url, headers=headers, **kwargs)
+
+    if response.status_code == 304 and entry is not None:
+        stats.incr("http_cache_hits")
+        response = _cache.revive(entry, response)
+    elif response.ok:
+        stats.incr("http_cache_misses")
+        _cache.store(url, response)
+
+    return response
+
+
+# Runs `fn(response.text, *args)` (on `executor` if given) but reuses the
+# result from an earlier run if the body (and the HTML parser used) didn't
+# change since then.
+def parse(
+    response: requests.Response,
+    fn: Callable,
+    *args,
+    executor: concurrent.futures.Executor | None = None,
+):
+    compute = fn
+    if executor is not None:
+
+        def compute(*args):
+            result, counters = executor.submit(stats.collect, fn, *args).result()
+            stats.merge(counters)
+            return result
+
+    if _cache is None:
+        return compute(response.text, *args)
+
+    return _cache.parsed(
+        fn, response.text, *args, variant=htmlparse.BACKEND, compute=compute
+    )
@@ -0,0 +1,162 @@
+import hashlib
+from collections.abc import Iterable, Iterator
+from datetime import UTC, datetime
+
+import timeutil
+from event import DanceEvent
+
+# Writes the iCalendar feed as text, event by event, instead of building an
+# icalendar object tree first and serializing it as a whole.
+# Calendar apps poll the feed and only update events whose DTSTAMP or
+# SEQUENCE changed, so both come from the store (when the event was last
+# changed and how often) and the feed stays the same as long as the events
+# do.
+
+TIMEZONE = "Europe/Vienna"
+
+# All times are local times in Vienna, so the feed describes the timezone
+# once instead of relying on every client to know it.
+VTIMEZONE = [
+    "BEGIN:VTIMEZONE",
+    "TZID:Europe/Vienna",
+    "BEGIN:DAYLIGHT",
+    "TZOFFSETFROM:+0100",
+    "TZOFFSETTO:+0200",
+    "TZNAME:CEST",
+    "DTSTART:19700329T020000",
+    "RRULE:FREQ=YEARLY;BYMONTH=3;BYDAY=-1SU",
+    "END:DAYLIGHT",
+    "BEGIN:STANDARD",
+    "TZOFFSETFROM:+0200",
+    "TZOFFSETTO:+0100",
+    "TZNAME:CET",
+    "DTSTART:19701025T030000",
+    "RRULE:FREQ=YEARLY;BYMONTH=10;BYDAY=-1SU",
+    "END:STANDARD",
+    "END:VTIMEZONE",
+]
+
+_ESCAPES = str.maketrans({"\\": "\\\\", ";": "\\;", ",": "\\,", "\n": "\\n", "\r": ""})
+
+
+def escape(text: str) -> str:
+    return text.translate(_ESCAPES)
+
+
+# Lines may be at most 75 octets long, longer ones continue on the next line
+# after a space. A line is never split inside of a UTF-8 character.
+def fold(line: str) -> str:
+    if len(line) <= 75 and line.isascii():
+        return line
+
+    data = line.encode()
+    parts = []
+    start, limit = 0, 75
+    while len(data) - start > limit:
+        end = start + limit
+        while data[end] & 0xC0 == 0x80:
+            end -= 1
+        parts.append(data[start:end].decode())
+        start, limit = end, 74
+    parts.append(data[start:].decode())
+    return "\r\n ".join(parts)
+
+
+# YYYYMMDDTHHMMSS, isoformat is a lot faster than strftime.
+def _datetime(d: datetime) -> str:
+    return d.isoformat(timespec="seconds").replace("-", "").replace(":", "")
+
+
+# The key stays the same between runs, so that calendars update the event
+# instead of adding it again. A series starts later every week, so it gets an
+# id from what doesn't change.
+def uid(series: list[DanceEvent]) -> str:
+    event = series[0]
+    if event.recurrence is None:
+        return event.key + "@dancetime.flofriday.dev"
+
+    identity = (
+        event.recurrence,
+        event.dancing_school,
+        event.name,
+        event.starts_at.time(),
+    )
+    digest = hashlib.sha1(repr(identity).encode()).hexdigest()[:16]
+    return f"series-{digest}@dancetime.flofriday.dev"
+
+
+# When the series last changed and how often it did, from the versions
+# (key -> (crawled at, count)) in the store.
+def revision(
+    series: list[DanceEvent], versions: dict[str, tuple[datetime, int]]
+) -> tuple[datetime, int]:
+    known = [versions[e.key] for e in series if e.key in versions]
+    if not known:
+        return datetime.now(), 0
+    return max(v[0] for v in known), max(v[1] for v in known) - 1
+
+
+# Everything of a VEVENT but its UID, DTSTAMP and SEQUENCE, with a RRULE and
+# EXDATEs if it is a series of weekly events.
+def details(
+    series: list[DanceEvent], description: str, html_description: str
+) -> list[str]:
+    event = series[0]
+    lines = [
+        f"SUMMARY:{escape(event.name)}",
+        f"DTSTART;TZID={TIMEZONE}:{_datetime(event.starts_at)}",
+    ]
+    if event.ends_at is not None:
+        lines.append(f"DTEND;TZID={TIMEZONE}:{_datetime(event.ends_at)}")
+
+    if event.recurrence is not None:
+        dates = timeutil.recurrence_dates(
+            event.recurrence, event.starts_at, series[-1].starts_at
+        )
+        lines.append(f"RRULE:{event.recurrence};COUNT={len(dates)}")
+        excluded = sorted(set(dates) - {e.starts_at for e in series})
+        if excluded:
+            lines.append(f"EXDATE;TZID={TIMEZONE}:{','.join(map(_datetime, excluded))}")
+
+    lines += [
+        f"LOCATION:{escape(event.dancing_school)}",
+        f"DESCRIPTION:{escape(description)}",
+        f"X-ALT-DESC;FMTTYPE=text/html:{escape(html_description)}",
+    ]
+    return lines
+
+
+# A series has no row of its own in the store and its first date, COUNT and
+# EXDATEs change as weeks pass, so its revision is tracked by what we write
+# for it (see store.series_revision).
+def fingerprint(details: list[str]) -> str:
+    return hashlib.sha1("\n".join(details).encode()).hexdigest()
+
+
+def vevent(
+    series: list[DanceEvent], details: list[str], stamp: datetime, sequence: int
+) -> str:
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:{uid(series)}",
+        f"DTSTAMP:{_datetime(stamp.astimezone(UTC).replace(tzinfo=None))}Z",
+        f"SEQUENCE:{sequence}",
+        *details,
+        "END:VEVENT",
+    ]
+    return "".join(fold(line) + "\r\n" for line in lines)
+
+
+# The whole calendar as chunks of text, to be written one after another.
+def calendar(vevents: Iterable[str], name: str = "DanceTime") -> Iterator[str]:
+    head = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        "PRODID:-//DanceTime//flofriday//",
+        f"X-WR-CALNAME:{escape(name)}",
+        f"X-WR-TIMEZONE:{TIMEZONE}",
+        *VTIMEZONE,
+    ]
+    yield "".join(fold(line) + "\r\n" for line in head)
+    yield from vevents
+    yield "END:VCALENDAR\r\n"
@@ -1,36 +1,20 @@
-import re
 from datetime import datetime
 
-import requests
-from bs4 import BeautifulSoup
-
+import crawl
+import germandate
+import htmlparse
 from event import DanceEvent
 
 
 # Parses dates in the format: `Samstag, 21.01.2023 19:30 - 22:15 Uhr`
 # which is quite common on the page.
 def parse_datetimes(text: str) -> tuple[datetime, datetime]:
-    date_text, start_text, end_text = re.search(
-        ", ([0-9\\.]+) ([0-9:]+) - ([0-9:]+) Uhr", text
-    ).groups()
-
-    day = datetime.strptime(date_text, "%d.%m.%Y")
-    start_hour = int(start_text.split(":")[0])
-    start_min = int(start_text.split(":")[1])
-    end_hour = int(end_text.split(":")[0])
-    end_min = int(end_text.split(":")[1])
+    return germandate.parse_range(text)
 
-    return (
-        day.replace(hour=start_hour, minute=start_min),
-        day.replace(hour=end_hour, minute=end_min),
-    )
 
-
-def download_immervoll() -> list[DanceEvent]:
-    response = requests.get("https://www.tanzschule-immervoll.at/events/", timeout=10)
-    response.raise_for_status()
-
-    soup = BeautifulSoup(response.text, features="html.parser")
+def parse_immervoll(html: str) -> list[DanceEvent]:
+    # Only the first (events) and third (perfections) table are used.
+    soup = htmlparse.make_soup(html, tags=["table"])
     table_elements = soup.find_all("table")
 
     # Parse the events
@@ -101,3 +85,14 @@ def download_immervoll() -> list[DanceEvent]:
         )
 
     return events
+
+
+async def download_immervoll_async() -> list[DanceEvent]:
+    response = await crawl.fetch("https://www.tanzschule-immervoll.at/events/")
+    response.raise_for_status()
+
+    return await crawl.parse(response, parse_immervoll)
+
+
+def download_immervoll() -> list[DanceEvent]:
+    return crawl.run(download_immervoll_async())
@@ -1,4 +1,4 @@
-import dateparser
+from datetime import time
 
 from event import DanceEvent
 from timeutil import Weekday, weekly_event
@@ -17,8 +17,8 @@ def create_perfections() -> list[DanceEvent]:
         events += weekly_event(
             weekday,
             DanceEvent(
-                starts_at=dateparser.parse("19:30"),
-                ends_at=dateparser.parse("21:30"),
+                starts_at=time(19, 30),
+                ends_at=time(21, 30),
                 name="Perfektion",
                 price_euro_cent=500,
                 description="Offener Tanzabend für alle! Kursteilnahme nicht notwendig.",
@@ -1,31 +1,42 @@
 import argparse
-import concurrent.futures
-import contextlib
+import asyncio
 import csv
+import functools
+import hashlib
 import html
 import inspect
 import json
 import os
-import shutil
 import sys
-import uuid
-from dataclasses import dataclass
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import asdict, dataclass, field
 from datetime import datetime, timedelta
-from zoneinfo import ZoneInfo
 
-import icalendar
-from jinja2 import Template, select_autoescape
 from requests.exceptions import ConnectionError, HTTPError
 
-from ballsaal import download_ballsaal
-from chris import download_chris
-from dance4fun import download_dance4fun
+import crawl
+import horizon
+import htmlparse
+import httpclient
+import ics
+import memo
+import output
+import serialize
+import snapshot
+import startup
+import stats
+import store
+import timeutil
+from ballsaal import download_ballsaal_async
+from chris import download_chris_async
+from dance4fun import download_dance4fun_async
 from dimitarstefanin import download_dimitarstefanin
 from dorner import download_dorner
-from event import DanceEvent
-from immervoll import download_immervoll
+from event import DanceEvent, slug
+from immervoll import download_immervoll_async
 from kopetzky import download_kopetzky
-from rueff import download_rueff
+from rueff import download_rueff_async
 from schwebach import download_schwebach
 from strobl import download_strobl
 
@@ -36,67 +47,165 @@ class MetaData:
     crawled_at: datetime
     duration: timedelta
     error_messages: list[str]
+    stats: dict[str, int] = field(default_factory=dict)
+    # The id of the crawl in the store, which is also the sequence number of
+    # the change feed.
+    seq: int = 0
 
 
-def download_events() -> tuple[list[DanceEvent], MetaData]:
-    downloaders = [
-        ("Ballsaal", download_ballsaal),
-        ("Chris", download_chris),
-        ("Immervoll", download_immervoll),
-        ("Rueff", download_rueff),
-        ("Schwebach", download_schwebach),
-        ("Strobl", download_strobl),
-        ("Kopetzky", download_kopetzky),
-        ("Dorner", download_dorner),
-        ("Dance4Fun", download_dance4fun),
-        ("Dimitar Stefanin", download_dimitarstefanin),
-    ]
+@dataclass
+class Source:
+    name: str
+    # Scraping sources are coroutines that share the event loop, the
+    # hardcoded schedules are plain functions.
+    download: Callable[[], list[DanceEvent] | Awaitable[list[DanceEvent]]]
+    static: bool = False
+
+    # How long the source may take before we give up on it.
+    @property
+    def budget_seconds(self) -> float:
+        return STATIC_BUDGET_SECONDS if self.static else SCRAPE_BUDGET_SECONDS
+
+    # How often the daemon refreshes the source. The hardcoded schedules only
+    # change when the day changes.
+    @property
+    def refresh_interval(self) -> timedelta:
+        return STATIC_REFRESH if self.static else SCRAPE_REFRESH
+
+    def next_refresh(self, refreshed_at: datetime) -> datetime:
+        next_refresh = refreshed_at + self.refresh_interval
+        if self.static:
+            midnight = datetime.combine(
+                refreshed_at.date() + timedelta(days=1), datetime.min.time()
+            )
+            next_refresh = min(next_refresh, midnight)
+        return next_refresh
+
+
+SCRAPE_BUDGET_SECONDS = 25
+STATIC_BUDGET_SECONDS = 5
+SCRAPE_REFRESH = timedelta(minutes=30)
+STATIC_REFRESH = timedelta(days=1)
+
+SOURCES = [
+    Source("Ballsaal", download_ballsaal_async),
+    Source("Chris", download_chris_async),
+    Source("Immervoll", download_immervoll_async),
+    Source("Rueff", download_rueff_async),
+    Source("Schwebach", download_schwebach, static=True),
+    Source("Strobl", download_strobl, static=True),
+    Source("Kopetzky", download_kopetzky, static=True),
+    Source("Dorner", download_dorner, static=True),
+    Source("Dance4Fun", download_dance4fun_async),
+    Source("Dimitar Stefanin", download_dimitarstefanin, static=True),
+]
+
+# How many crawls back changes.json goes. Clients that are further behind have
+# to fetch events.json again.
+CHANGES_KEPT = 100
+
+# The whole crawl must be done by the deadline and every source has its own
+# budget within it, so that a hanging source can't hold up the others.
+DEADLINE_SECONDS = 30
+
+
+# Returns the events of the source and the error messages that came up while
+# downloading them.
+async def download_source(
+    source: Source, deadline_seconds: float, crawled_at: datetime
+) -> tuple[list[DanceEvent], list[str]]:
+    budget = min(source.budget_seconds, deadline_seconds)
+    messages = []
+
+    async def run() -> list[DanceEvent]:
+        if inspect.iscoroutinefunction(source.download):
+            return await source.download()
+        return await crawl.to_thread(source.download)
+
+    try:
+        new_events = await asyncio.wait_for(run(), timeout=budget)
+        print(
+            f"Downloaded {source.name} \tin {(datetime.now() - crawled_at).total_seconds():.2f}s \t({len(new_events):02d} events)"
+        )
+        snapshot.save_source(source.name, new_events)
+        return new_events, messages
+    except TimeoutError:
+        message = f"{source.name} took longer than {budget:g}s"
+
+    except HTTPError as e:
+        status = e.response.status_code
+        url = e.request.url
+        message = f"Got {status} from {url}"
+
+    except ConnectionError as e:
+        message = f"Failed to connect to {e.request.url}"
+
+    except Exception as e:
+        line_no, file_name = inspect.trace()[-1][2:4]
+        exc_type, _, _exc_tb = sys.exc_info()
+        message = f"{exc_type.__name__} in {file_name}:{line_no}: {str(e)}"
+
+    print("🔥 " + message)
+    messages.append(message)
+
+    # Better old events than no events at all.
+    saved = snapshot.load_source(source.name)
+    if saved is None:
+        return [], messages
+
+    saved_at, saved_events = saved
+    message = f"Showing stale {source.name} events from {saved_at:%d.%m.%Y %H:%M}"
+    print("🧊 " + message)
+    messages.append(message)
+    stats.incr("stale_sources")
+    return saved_events, messages
+
+
+async def download_sources_async(
+    sources: list[Source], deadline_seconds: float, crawled_at: datetime
+) -> list[tuple[list[DanceEvent], list[str]]]:
+    results = await asyncio.gather(
+        *(download_source(s, deadline_seconds, crawled_at) for s in sources)
+    )
+    memo.save()
+    return results
+
+
+async def download_events_async(
+    horizon_days: int | None = None,
+    deadline_seconds: float = DEADLINE_SECONDS,
+) -> tuple[list[DanceEvent], MetaData]:
+    if horizon_days is not None:
+        horizon.set_days(horizon_days)
 
-    events = []
-    error_messages = []
     crawled_at = datetime.now()
-    with concurrent.futures.ThreadPoolExecutor(
-        max_workers=len(downloaders)
-    ) as executor:
-        results = [executor.submit(downloader[1]) for downloader in downloaders]
-
-        name_map = {r: downloaders[i][0] for (i, r) in enumerate(results)}
-
-        for result in concurrent.futures.as_completed(results):
-            try:
-                new_events = result.result()
-                print(
-                    f"Downloaded {(name_map[result])} \tin {(datetime.now() - crawled_at).total_seconds():.2f}s \t({len(new_events):02d} events)"
-                )
-                events += new_events
-            except HTTPError as e:
-                status = e.response.status_code
-                url = e.request.url
-                message = f"Got {status} from {url}"
-                print("🔥 " + message)
-                error_messages.append(message)
-
-            except ConnectionError as e:
-                message = f"Failed to connect to {e.request.url}"
-                print("🔥 " + message)
-                error_messages.append(message)
-
-            except Exception as e:
-                line_no, file_name = inspect.trace()[-1][2:4]
-                exc_type, _, _exc_tb = sys.exc_info()
-                message = f"{exc_type.__name__} in {file_name}:{line_no}: {str(e)}"
-                print("🔥 " + message)
-                error_messages.append(message)
+    stats.reset()
+
+    results = await download_sources_async(SOURCES, deadline_seconds, crawled_at)
+    events = [
+        event
+        for result, _ in results
+        for event in result
+        if horizon.includes(event.starts_at)
+    ]
 
     metadata = MetaData(
         count=len(events),
         crawled_at=crawled_at,
         duration=datetime.now() - crawled_at,
-        error_messages=error_messages,
+        error_messages=[message for _, messages in results for message in messages],
+        stats=stats.snapshot(),
     )
     return events, metadata
 
 
+def download_events(
+    horizon_days: int | None = None,
+    deadline_seconds: float = DEADLINE_SECONDS,
+) -> tuple[list[DanceEvent], MetaData]:
+    return crawl.run(download_events_async(horizon_days, deadline_seconds))
+
+
 def format_price(price_euro_cent: int) -> str:
     if price_euro_cent % 100 == 0:
         return f"€{price_euro_cent // 100},-"
@@ -106,7 +215,7 @@ def format_price(price_euro_cent: int) -> str:
 
 def write_csv(events: list[DanceEvent], metadata: MetaData, folder: str):
     csv_path = os.path.join(folder, "events.csv")
-    with open(csv_path, "w", encoding="utf-8") as csvfile:
+    with output.atomic_open(csv_path) as csvfile:
         writer = csv.writer(csvfile, delimiter=",")
         writer.writerow(
             [
@@ -135,110 +244,378 @@ def write_csv(events: list[DanceEvent], metadata: MetaData, folder: str):
             )
 
 
-def write_json(events: list[DanceEvent], metadata: MetaData, folder: str):
-    # A helper function to serialize datetime
-    def defaultconverter(o):
-        if isinstance(o, datetime):
-            return o.isoformat()
-        if isinstance(o, timedelta):
-            return (o.seconds * 1000) + int(o.microseconds / 1000)
-        return o.__dict__
+# Besides the combined feeds there is one per school (schools/<school>) and
+# category (categories/<category>), so that clients that only want some of
+# the events don't have to download all of them and filter them themselves.
+# A category is recognized by words in the name of the event.
+CATEGORIES = {
+    "perfektion": ("Perfektion", ["perfektion"]),
+    "tanzcafe": ("Tanzcafe", ["tanzcafe", "tanzcafé", "tanz-cafe", "5-uhr-tee"]),
+}
+
+
+# The feeds (path without extension, title) an event belongs to. There are
+# only a few schools and names, but many events.
+@functools.lru_cache(maxsize=4096)
+def event_feeds(school: str, name: str) -> list[tuple[str, str]]:
+    feeds = [(f"schools/{slug(school)}", school)]
+    name = name.casefold()
+    for category, (title, words) in CATEGORIES.items():
+        if any(word in name for word in words):
+            feeds.append((f"categories/{category}", title))
+    return feeds
+
+
+# Encodes every item once, and collects the fragments for the combined feed
+# and for every feed the (first) event of the item belongs to.
+def split_feeds(
+    items: list, encode: Callable[..., str], first: Callable[..., DanceEvent]
+) -> tuple[list[str], dict[tuple[str, str], list[str]]]:
+    combined = []
+    feeds: dict[tuple[str, str], list[str]] = {}
+    for item in items:
+        fragment = encode(item)
+        combined.append(fragment)
+        event = first(item)
+        for feed in event_feeds(event.dancing_school, event.name):
+            feeds.setdefault(feed, []).append(fragment)
+    return combined, feeds
+
+
+# Writes the feeds with the extension and removes the ones that no longer
+# have events.
+def write_feeds(folder: str, extension: str, feeds: dict[str, str]):
+    for subfolder in ["schools", "categories"]:
+        os.makedirs(os.path.join(folder, subfolder), exist_ok=True)
+
+    for path, data in feeds.items():
+        output.write(os.path.join(folder, path + extension), data)
+
+    for subfolder in ["schools", "categories"]:
+        for entry in os.scandir(os.path.join(folder, subfolder)):
+            path, file_extension = os.path.splitext(f"{subfolder}/{entry.name}")
+            if file_extension == extension and path not in feeds:
+                output.remove(entry.path)
+
+
+# A helper function to serialize datetime
+def defaultconverter(o):
+    if isinstance(o, datetime):
+        return o.isoformat()
+    if isinstance(o, timedelta):
+        return (o.seconds * 1000) + int(o.microseconds / 1000)
+    if isinstance(o, DanceEvent):
+        return {"key": o.key} | o.__dict__
+    return o.__dict__
 
-    data = {
-        "timestamp": metadata.crawled_at,
-        "duration_ms": metadata.duration,
+
+def write_json(events: list[DanceEvent], metadata: MetaData, folder: str):
+    header = {
+        "seq": metadata.seq,
+        "timestamp": metadata.crawled_at.isoformat(),
+        "duration_ms": defaultconverter(metadata.duration),
         "event_count": metadata.count,
         "error_messages": metadata.error_messages,
-        "events": events,
+        "stats": metadata.stats,
     }
 
+    combined, feeds = split_feeds(events, serialize.encode_event, lambda e: e)
+
     json_path = os.path.join(folder, "events.json")
-    with open(json_path, "w", encoding="utf-8") as json_file:
-        json.dump(data, json_file, indent=2, default=defaultconverter)
+    output.write(json_path, serialize.encode_fragments(header, combined))
+
+    # Without anything that changes every crawl, so that a feed is only
+    # rewritten when its events change.
+    write_feeds(
+        folder,
+        ".json",
+        {
+            path: serialize.encode_fragments(
+                {"title": title, "event_count": len(fragments)}, fragments
+            )
+            for (path, title), fragments in feeds.items()
+        },
+    )
 
 
-def write_html(events: list[DanceEvent], metadata: MetaData, folder: str):
-    def format_date(d: datetime) -> str:
-        if d.date() == datetime.now().date():
-            return "Heute"
-        if d.date() == (datetime.now() + timedelta(days=1)).date():
-            return "Morgen"
-
-        days = ["Mo", "Di", "Mi", "Do", "Fr", "Sa", "So"]
-        if (d - datetime.now()).days < 7:
-            return days[d.weekday()] + "."
-
-        return d.strftime("%d.%m.%Y") + " " + days[d.weekday()] + "."
-
-    with open("template.html", encoding="utf-8") as template_html:
-        template = Template(
-            template_html.read(),
-            autoescape=select_autoescape(
-                enabled_extensions=("html", "xml"),
-                default_for_string=True,
-            ),
-        )
-        template.globals["format_date"] = format_date
-        template.globals["format_price"] = format_price
+def write_ndjson(events: list[DanceEvent], metadata: MetaData, folder: str):
+    ndjson_path = os.path.join(folder, "events.ndjson")
+    with output.atomic_open(ndjson_path) as ndjson_file:
+        ndjson_file.writelines(serialize.encode_ndjson(events))
 
-    index_path = os.path.join(folder, "index.html")
-    with open(index_path, "w", encoding="utf-8") as index:
-        index.write(
-            template.render(
-                events=events,
-                metadata=metadata,
-            )
-        )
 
+# Instead of downloading events.json again and diffing it, clients can
+# remember the `seq` they have and apply all changes with a higher `seq`. If
+# their `seq` is lower than `since` they are too far behind and need to fetch
+# events.json again.
+def write_changes(metadata: MetaData, folder: str):
+    since = max(store.first_crawl(), metadata.seq - CHANGES_KEPT)
+    data = {
+        "seq": metadata.seq,
+        "since": since,
+        "changes": store.changes(since),
+    }
 
-def write_ics(events: list[DanceEvent], _: MetaData, folder: str):
-    # Create a new calendar
-    cal = icalendar.Calendar()
-    cal.add("prodid", "-//DanceTime//flofriday//")
-    cal.add("version", "2.0")
-    cal.add("x-wr-calname", "DanceTime")
+    changes_path = os.path.join(folder, "changes.json")
+    with output.atomic_open(changes_path) as changes_file:
+        json.dump(data, changes_file, indent=2, default=defaultconverter)
 
-    for event in events:
-        # Create a new event
-        ics_event = icalendar.Event()
 
-        # Generate a UUID
-        event_uuid = str(uuid.uuid4()) + "@dancetime.flofriday.dev"
+# The events split by the month they start in (events/YYYY-MM.json) and a
+# manifest.json listing the shards, so that clients can fetch only the months
+# they need. Nothing but the events goes into a shard, so a month that didn't
+# change keeps exactly the same bytes.
+def write_shards(events: list[DanceEvent], metadata: MetaData, folder: str):
+    shards_folder = os.path.join(folder, "events")
+    os.makedirs(shards_folder, exist_ok=True)
 
-        # Set the event properties
-        ics_event.add("uid", event_uuid)
-        ics_event.add("summary", event.name)
-        ics_event.add(
-            "dtstamp", datetime.now().replace(tzinfo=ZoneInfo("Europe/Vienna"))
+    months: dict[str, list[DanceEvent]] = {}
+    for event in events:
+        months.setdefault(f"{event.starts_at:%Y-%m}", []).append(event)
+
+    manifest = {"shards": []}
+    for month, month_events in sorted(months.items()):
+        data = serialize.encode_document({"month": month}, month_events).encode()
+        path = f"events/{month}.json"
+        output.write(os.path.join(folder, path), data)
+        manifest["shards"].append(
+            {
+                "month": month,
+                "path": path,
+                "count": len(month_events),
+                "sha256": hashlib.sha256(data).hexdigest(),
+            }
         )
-        ics_event.add(
-            "dtstart", event.starts_at.replace(tzinfo=ZoneInfo("Europe/Vienna"))
+
+    # Months that are over (or lost all their events).
+    for entry in os.scandir(shards_folder):
+        month, extension = os.path.splitext(entry.name)
+        if extension == ".json" and month not in months:
+            output.remove(entry.path)
+
+    output.write(
+        os.path.join(folder, "manifest.json"),
+        json.dumps(manifest, indent=2).encode(),
+    )
+
+
+# The daemon renders the page after every crawl, so the template is only
+# compiled once per process. With a cache folder the compiled bytecode is also
+# kept between runs, so that even a single run doesn't compile it again.
+TEMPLATE_CACHE_DIR: str | None = None
+
+
+def configure_templates(cache_dir: str | None = None):
+    global TEMPLATE_CACHE_DIR
+
+    TEMPLATE_CACHE_DIR = cache_dir
+    template_environment.cache_clear()
+
+
+@functools.cache
+def template_environment():
+    from jinja2 import (
+        Environment,
+        FileSystemBytecodeCache,
+        FileSystemLoader,
+        select_autoescape,
+    )
+
+    bytecode_cache = None
+    if TEMPLATE_CACHE_DIR is not None:
+        os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
+        bytecode_cache = FileSystemBytecodeCache(TEMPLATE_CACHE_DIR)
+
+    environment = Environment(
+        loader=FileSystemLoader("."),
+        autoescape=select_autoescape(
+            enabled_extensions=("html", "xml"),
+            default_for_string=True,
+        ),
+        bytecode_cache=bytecode_cache,
+    )
+    environment.globals["format_date"] = format_date
+    environment.globals["format_price"] = format_price
+    return environment
+
+
+# `now` is passed in by the template, so that it is only looked up once per
+# page and not for every event.
+def format_date(d: datetime, now: datetime) -> str:
+    if d.date() == now.date():
+        return "Heute"
+    if d.date() == (now + timedelta(days=1)).date():
+        return "Morgen"
+
+    days = ["Mo", "Di", "Mi", "Do", "Fr", "Sa", "So"]
+    if (d - now).days < 7:
+        return days[d.weekday()] + "."
+
+    return d.strftime("%d.%m.%Y") + " " + days[d.weekday()] + "."
+
+
+def write_html(events: list[DanceEvent], metadata: MetaData, folder: str):
+    template = template_environment().get_template("template.html")
+
+    # Streamed into the file instead of rendering the whole page into memory.
+    index_path = os.path.join(folder, "index.html")
+    with output.atomic_open(index_path) as index_file:
+        index_file.writelines(
+            template.generate(events=events, metadata=metadata, now=datetime.now())
         )
-        if event.ends_at is not None:
-            ics_event.add(
-                "dtend", event.ends_at.replace(tzinfo=ZoneInfo("Europe/Vienna"))
-            )
-        ics_event.add("location", event.dancing_school)
 
+
+def write_ics(events: list[DanceEvent], metadata: MetaData, folder: str):
+    versions = store.versions()
+
+    def vevent(series: list[DanceEvent]) -> str:
+        event = series[0]
         description = event.website + "\n\n"
         if event.price_euro_cent is not None:
             description += f"Preis pro Person: {format_price(event.price_euro_cent)}\n"
         description += event.description
-        ics_event.add("description", description)
-        ics_event.add(
-            "x-alt-desc;fmttype=text/html",
+        html_description = (
             '<!DOCTYPE HTML PUBLIC "-//W3C//DTD HTML 3.2//EN><HTML><BODY>\n'
             f'<a href="{event.website}">Webseite</a><br><br>{html.escape(description).replace("\n", "<br>")}'
-            "\n</BODY></HTML>",
+            "\n</BODY></HTML>"
         )
+        details = ics.details(series, description, html_description)
+        stamp, sequence = ics.revision(series, versions)
+        if event.recurrence is not None:
+            stamp, sequence = store.series_revision(
+                ics.uid(series), ics.fingerprint(details), metadata.crawled_at, sequence
+            )
+        return ics.vevent(series, details, stamp, sequence)
 
-        # Add the event to the calendar
-        cal.add_component(ics_event)
+    # Events of the same weekly schedule become one event with a RRULE, the
+    # weeks the series skips (e.g. holidays) are excluded with EXDATE.
+    combined, feeds = split_feeds(
+        timeutil.group_series(events), vevent, lambda series: series[0]
+    )
 
-    # Serialize the calendar to an ICS file
+    # Line endings are CRLF already.
     ics_path = os.path.join(folder, "events.ics")
-    with open(ics_path, "wb") as icsfile:
-        icsfile.write(cal.to_ical())
+    with output.atomic_open(ics_path, newline="") as f:
+        f.writelines(ics.calendar(combined))
+
+    write_feeds(
+        folder,
+        ".ics",
+        {
+            path: "".join(ics.calendar(fragments, name=f"DanceTime: {title}"))
+            for (path, title), fragments in feeds.items()
+        },
+    )
+
+
+def write_outputs(events: list[DanceEvent], metadata: MetaData, folder: str):
+    snapshot.save_crawl(events, asdict(metadata))
+    metadata.seq = store.record_crawl(events, metadata.crawled_at)
+
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    events = store.events(start=today)
+    metadata.count = len(events)  # update count after filtering
+
+    # Create a couple of data files
+    write_json(events, metadata, folder)
+    write_ndjson(events, metadata, folder)
+    write_changes(metadata, folder)
+    write_shards(events, metadata, folder)
+    write_csv(events, metadata, folder)
+    write_ics(events, metadata, folder)
+
+    # Create the Webpage which needs some static files
+    static_files = [
+        "index.css",
+        "logo32.png",
+        "logo180.png",
+        "logo.svg",
+        "calendar.png",
+    ]
+
+    for file in static_files:
+        output.copy(file, os.path.join(folder, file))
+
+    write_html(events, metadata, folder)
+
+
+def print_cache_stats(metadata: MetaData):
+    print(
+        f"HTTP cache: {metadata.stats.get('http_cache_hits', 0)} hits, "
+        f"{metadata.stats.get('http_cache_misses', 0)} misses, "
+        f"{metadata.stats.get('detail_fetches_avoided', 0)} detail pages skipped"
+    )
+
+
+# Renders the outputs of the last crawl again, so that after a restart there
+# is something to serve while the new crawl is running.
+def write_snapshot_outputs(folder: str) -> bool:
+    saved = snapshot.load_crawl()
+    if saved is None:
+        return False
+
+    events, metadata = saved
+    write_outputs(events, MetaData(**metadata), folder)
+    return True
+
+
+# In daemon mode the process (and with it all imports, the HTTP connections
+# and caches) stays warm. Every source is refreshed on its own interval and
+# the outputs are only written again if something actually changed.
+def run_daemon(args: argparse.Namespace):
+    # source name -> (refreshed at, events, error messages)
+    state: dict[str, tuple[datetime, list[DanceEvent], list[str]]] = {}
+
+    # Pick up where the last run left off instead of crawling everything
+    # again right after a restart.
+    for source in SOURCES:
+        saved = snapshot.load_source(source.name)
+        if saved is not None:
+            saved_at, saved_events = saved
+            state[source.name] = (saved_at, saved_events, [])
+
+    horizon.set_days(args.horizon_days)
+    last_fingerprint = None
+    while True:
+        now = datetime.now()
+        due = [
+            source
+            for source in SOURCES
+            if source.name not in state
+            or source.next_refresh(state[source.name][0]) <= now
+        ]
+
+        if due:
+            stats.reset()
+            results = crawl.run(download_sources_async(due, args.deadline, now))
+            for source, (new_events, messages) in zip(due, results, strict=True):
+                state[source.name] = (now, new_events, messages)
+
+        events = [
+            event
+            for _, source_events, _ in state.values()
+            for event in source_events
+            if horizon.includes(event.starts_at)
+        ]
+        error_messages = [m for _, _, messages in state.values() for m in messages]
+
+        # The date is part of it because past events drop out at midnight.
+        fingerprint = hash((now.date(), repr(events), repr(error_messages)))
+        if fingerprint != last_fingerprint:
+            metadata = MetaData(
+                count=len(events),
+                crawled_at=now,
+                duration=datetime.now() - now,
+                error_messages=error_messages,
+                stats=stats.snapshot(),
+            )
+            write_outputs(events, metadata, args.output)
+            last_fingerprint = fingerprint
+            print(f"Created {metadata.count} events at {now:%d.%m.%Y %H:%M}. 💃✨")
+
+        next_refresh = min(s.next_refresh(state[s.name][0]) for s in SOURCES)
+        # Wake up at least every few minutes in case the clock jumps.
+        time.sleep(min(max(1, (next_refresh - datetime.now()).total_seconds()), 300))
 
 
 def main():
@@ -252,36 +629,122 @@ def main():
         default=".",
         help="folder into which the outputs should be written.",
     )
+    parser.add_argument(
+        "--http-pool-size",
+        type=int,
+        default=httpclient.POOL_MAXSIZE,
+        help="number of keep-alive connections per host.",
+    )
+    parser.add_argument(
+        "--http-timeout",
+        type=float,
+        default=httpclient.TIMEOUT,
+        help="timeout in seconds for every HTTP request.",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        required=False,
+        default=".cache",
+        help="folder in which downloaded pages are cached between runs.",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="don't keep any state (cache, details, snapshots) between runs.",
+    )
+    parser.add_argument(
+        "--html-parser",
+        choices=htmlparse.BACKENDS,
+        default=htmlparse.BACKEND,
+        help="parser used for the HTML pages (lxml and html5lib must be installed).",
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=crawl.MAX_CONCURRENCY,
+        help="maximum number of requests in flight at once.",
+    )
+    parser.add_argument(
+        "--parse-mode",
+        choices=crawl.PARSE_MODES,
+        default=crawl.PARSE_MODE,
+        help="where pages are parsed (auto picks processes unless the GIL is off).",
+    )
+    parser.add_argument(
+        "--horizon-days",
+        type=int,
+        default=horizon.DAYS,
+        help="how many days into the future events are collected.",
+    )
+    parser.add_argument(
+        "--deadline",
+        type=float,
+        default=DEADLINE_SECONDS,
+        help="seconds after which slow sources are replaced by their last result.",
+    )
+    parser.add_argument(
+        "--warm-start",
+        action="store_true",
+        help="first render the outputs of the last crawl, then crawl.",
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="keep running and refresh every source on its own interval.",
+    )
+    parser.add_argument(
+        "--startup-report",
+        action="store_true",
+        help="print how long the imports take per module and exit.",
+    )
+    parser.add_argument(
+        "--startup-budget-ms",
+        type=float,
+        default=None,
+        help="with --startup-report, fail if the imports take longer than this.",
+    )
     args = parser.parse_args()
 
-    events, metadata = download_events()
+    if args.startup_report:
+        sys.exit(startup.report(args.startup_budget_ms))
 
-    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-    events = list(filter(lambda e: e.starts_at >= today, events))
-    metadata.count = len(events)  # update count after sorting
-    events = sorted(events, key=lambda e: e.starts_at)
+    if not htmlparse.available(args.html_parser):
+        parser.error(f"the {args.html_parser} parser is not installed")
 
-    # Create a couple of data files
-    write_json(events, metadata, args.output)
-    write_csv(events, metadata, args.output)
-    write_ics(events, metadata, args.output)
+    crawl.configure(max_concurrency=args.max_concurrency, parse_mode=args.parse_mode)
+    htmlparse.configure(backend=args.html_parser)
 
-    # Create the Webpage which needs some static files
-    static_files = [
-        "index.css",
-        "logo32.png",
-        "logo180.png",
-        "logo.svg",
-        "calendar.png",
-    ]
+    httpclient.configure(
+        pool_maxsize=args.http_pool_size,
+        timeout=args.http_timeout,
+        cache_dir=None if args.no_cache else args.cache_dir,
+    )
+    if not args.no_cache:
+        memo.load(os.path.join(args.cache_dir, "details.pickle"))
+        snapshot.configure(args.cache_dir)
+        store.configure(os.path.join(args.cache_dir, "events.sqlite3"))
+        configure_templates(os.path.join(args.cache_dir, "templates"))
 
-    with contextlib.suppress(shutil.SameFileError):
-        for file in static_files:
-            shutil.copy(file, os.path.join(args.output, file))
+    if args.warm_start and write_snapshot_outputs(args.output):
+        print("Rendered the last crawl, now refreshing.")
 
-    write_html(events, metadata, args.output)
+    if args.daemon:
+        run_daemon(args)
+        return
+
+    events, metadata = download_events(
+        horizon_days=args.horizon_days, deadline_seconds=args.deadline
+    )
+    write_outputs(events, metadata, args.output)
 
     # Write final statistics
+    if not args.no_cache:
+        print_cache_stats(metadata)
+    written = stats.snapshot()
+    print(
+        f"Outputs: {written.get('outputs_written', 0)} written, "
+        f"{written.get('outputs_unchanged', 0)} unchanged"
+    )
     print(
         f"Created {metadata.count} events in {metadata.duration.total_seconds():.2f}s. 💃✨"
     )
@@ -0,0 +1,71 @@
+import contextlib
+import os
+import pickle
+from datetime import datetime, timedelta
+from typing import Any
+
+import stats
+
+# Ballsaal and Chris need one extra request per event for its details, but
+# the details of an event (end, price, sold out) hardly ever change. So we
+# remember them per detail URL and only ask again once they expired.
+# The closer an event is, the more likely it changes (or sells out), so the
+# time-to-live shrinks as the event approaches.
+MIN_TTL = timedelta(hours=1)
+MAX_TTL = timedelta(days=7)
+
+_path: str | None = None
+_entries: dict[str, tuple[datetime, Any]] = {}
+
+
+def ttl(starts_at: datetime) -> timedelta:
+    return min(MAX_TTL, max(MIN_TTL, (starts_at - datetime.now()) / 4))
+
+
+def load(path: str):
+    global _path, _entries
+
+    _path = path
+    try:
+        with open(path, "rb") as f:
+            _entries = pickle.load(f)
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+        _entries = {}
+
+
+def save():
+    if _path is None:
+        return
+
+    now = datetime.now()
+    entries = {url: entry for url, entry in _entries.items() if entry[0] > now}
+
+    tmp_path = _path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(entries, f)
+    os.replace(tmp_path, _path)
+
+
+def get(url: str) -> Any | None:
+    if _path is None:
+        return None
+
+    entry = _entries.get(url)
+    if entry is None:
+        return None
+
+    expires_at, value = entry
+    if expires_at <= datetime.now():
+        with contextlib.suppress(KeyError):
+            del _entries[url]
+        return None
+
+    stats.incr("detail_fetches_avoided")
+    return value
+
+
+def put(url: str, value: Any, starts_at: datetime):
+    if _path is None:
+        return
+
+    _entries[url] = (datetime.now() + ttl(starts_at), value)
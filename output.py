@@ -0,0 +1,131 @@
+import contextlib
+import filecmp
+import functools
+import os
+import shutil
+import tempfile
+from collections.abc import Callable, Iterator
+from typing import IO
+
+import stats
+
+# nginx serves the outputs while we write them, so every file is first
+# written to a hidden temporary file next to it (nginx doesn't serve dot
+# files) and then renamed over the old one, which is atomic. If the new
+# content is the same as the old one the old file is kept, so that its mtime
+# (and with it the Last-Modified and ETag nginx sends) only changes when the
+# content does, and quiet hours cost no writes at all.
+
+
+# Text outputs also get compressed siblings (events.json.gz, ...) that nginx
+# serves as they are (gzip_static), so compressing costs nothing per request.
+# zstd and brotli are only written if this Python can (zstd is in the
+# standard library since 3.14, brotli is a separate package).
+COMPRESSED_EXTENSIONS = {".json", ".ndjson", ".csv", ".ics", ".html", ".css", ".svg"}
+
+
+def _gzip(data: bytes) -> bytes:
+    import gzip
+
+    # Without a timestamp the same input always gives the same bytes.
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+@functools.cache
+def _compressors() -> dict[str, Callable[[bytes], bytes]]:
+    compressors = {".gz": _gzip}
+    try:
+        from compression import zstd
+
+        compressors[".zst"] = functools.partial(zstd.compress, level=19)
+    except ImportError:
+        pass
+    try:
+        import brotli
+
+        compressors[".br"] = brotli.compress
+    except ImportError:
+        pass
+    return compressors
+
+
+def siblings(path: str) -> list[str]:
+    return [path + suffix for suffix in _compressors()]
+
+
+# The siblings get the mtime of the original, so they are rewritten exactly
+# when the original changed (or they are missing).
+def _compress(path: str):
+    if os.path.splitext(path)[1] not in COMPRESSED_EXTENSIONS:
+        return
+
+    mtime = os.stat(path).st_mtime_ns
+    data = None
+    for suffix, compress in _compressors().items():
+        sibling = path + suffix
+        with contextlib.suppress(FileNotFoundError):
+            if os.stat(sibling).st_mtime_ns == mtime:
+                continue
+
+        if data is None:
+            with open(path, "rb") as f:
+                data = f.read()
+        with atomic_open(sibling, "wb", compress=False) as f:
+            f.write(compress(data))
+        os.utime(sibling, ns=(mtime, mtime))
+
+
+def remove(path: str):
+    for file in [path, *siblings(path)]:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(file)
+
+
+# Moves the finished temporary file into place, unless nothing changed.
+def _commit(tmp_path: str, path: str):
+    if os.path.exists(path) and filecmp.cmp(tmp_path, path, shallow=False):
+        os.remove(tmp_path)
+        stats.incr("outputs_unchanged")
+        return
+
+    # mkstemp only allows the owner to read it, but nginx needs to as well.
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, path)
+    stats.incr("outputs_written")
+
+
+# For outputs that are streamed into the file. The file is only committed if
+# the block finished without an exception.
+@contextlib.contextmanager
+def atomic_open(
+    path: str, mode: str = "w", compress: bool = True, **kwargs
+) -> Iterator[IO]:
+    if "b" not in mode:
+        kwargs.setdefault("encoding", "utf-8")
+
+    folder, name = os.path.split(path)
+    fd, tmp_path = tempfile.mkstemp(
+        dir=folder or ".", prefix=f".{name}.", suffix=".tmp"
+    )
+    try:
+        with open(fd, mode, **kwargs) as f:
+            yield f
+        _commit(tmp_path, path)
+        if compress:
+            _compress(path)
+    finally:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp_path)
+
+
+def write(path: str, data: str | bytes):
+    with atomic_open(path, "wb") as f:
+        f.write(data.encode() if isinstance(data, str) else data)
+
+
+def copy(src: str, dst: str):
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        return
+
+    with open(src, "rb") as source, atomic_open(dst, "wb") as f:
+        shutil.copyfileobj(source, f)
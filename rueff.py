@@ -1,21 +1,29 @@
 import re
+from datetime import time
 
-import requests
-from bs4 import BeautifulSoup
-from dateparser import parse
-
+import crawl
+import germandate
+import htmlparse
 from event import DanceEvent
 from timeutil import Weekday, weekly_event
 
 
 # Download the next dance breakfast from the website
-def download_rueff_breakfast() -> list[DanceEvent]:
-    response = requests.get(
-        "https://www.tanzschulerueff.at/fruehstueck.htm", timeout=10
-    )
+async def download_rueff_breakfast_async() -> list[DanceEvent]:
+    response = await crawl.fetch("https://www.tanzschulerueff.at/fruehstueck.htm")
     response.raise_for_status()
 
-    soup = BeautifulSoup(response.text, "html.parser")
+    return await crawl.parse(response, parse_rueff_breakfast)
+
+
+def download_rueff_breakfast() -> list[DanceEvent]:
+    return crawl.run(download_rueff_breakfast_async())
+
+
+def parse_rueff_breakfast(html: str) -> list[DanceEvent]:
+    # The description is found by its position on the page, so we need the
+    # whole tree here.
+    soup = htmlparse.make_soup(html)
     select = soup.find("select", {"name": "Auswahl"})
     options = select.find_all("option")
 
@@ -44,7 +52,7 @@ def download_rueff_breakfast() -> list[DanceEvent]:
 
         # Consider a typo on the website.
         date_text = date_text.replace("Julii", "Juli")
-        starts_at = parse(date_text, languages=["de"])
+        starts_at = germandate.parse(date_text)
 
         events.append(
             DanceEvent(
@@ -74,8 +82,8 @@ def create_perfections() -> list[DanceEvent]:
     events += weekly_event(
         Weekday.TUE,
         DanceEvent(
-            starts_at=parse("20:45"),
-            ends_at=parse("22:15"),
+            starts_at=time(20, 45),
+            ends_at=time(22, 15),
             name="Perfektion",
             price_euro_cent=500,
             description="Verbringen Sie einen angenehmen, netten Abend in unseren vielseitigen und beliebten Perfektionen und teilen Sie Ihr Tanzhobby mit Gleichgesinnten.",
@@ -88,8 +96,8 @@ def create_perfections() -> list[DanceEvent]:
     events += weekly_event(
         Weekday.FRI,
         DanceEvent(
-            starts_at=parse("16:15"),
-            ends_at=parse("17:45"),
+            starts_at=time(16, 15),
+            ends_at=time(17, 45),
             name="Afterwork Perfektion",
             price_euro_cent=500,
             description="Verbringen Sie einen angenehmen, netten Abend in unseren vielseitigen und beliebten Perfektionen und teilen Sie Ihr Tanzhobby mit Gleichgesinnten.",
@@ -102,8 +110,8 @@ def create_perfections() -> list[DanceEvent]:
     events += weekly_event(
         Weekday.SUN,
         DanceEvent(
-            starts_at=parse("20:15"),
-            ends_at=parse("21:45"),
+            starts_at=time(20, 15),
+            ends_at=time(21, 45),
             name="Perfektion",
             price_euro_cent=500,
             description="Verbringen Sie einen angenehmen, netten Abend in unseren vielseitigen und beliebten Perfektionen und teilen Sie Ihr Tanzhobby mit Gleichgesinnten.",
@@ -115,5 +123,9 @@ def create_perfections() -> list[DanceEvent]:
     return events
 
 
+async def download_rueff_async() -> list[DanceEvent]:
+    return await download_rueff_breakfast_async() + create_perfections()
+
+
 def download_rueff() -> list[DanceEvent]:
-    return download_rueff_breakfast() + create_perfections()
+    return crawl.run(download_rueff_async())
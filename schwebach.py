@@ -1,6 +1,7 @@
 import re
 from datetime import date, datetime, timedelta
 
+import horizon
 from event import DanceEvent
 
 
@@ -59,14 +60,15 @@ def generate_tanzcafe_events(start_date: datetime) -> list[DanceEvent]:
         (4, 17, 22.5),  # Friday
     ]
 
-    # Generate events for the next 4 weeks
+    # Generate events until the horizon
     base_date = start_date.date()
-    for _ in range(4):  # 4 weeks ahead
+    end_date = horizon.end().date()
+    while base_date < end_date:
         for weekday, start_hour, end_hour in afternoon_schedule + evening_schedule:
             event_date = get_next_weekday(base_date, weekday)
 
-            # Skip if it's before our start date
-            if event_date < base_date:
+            # Skip if it's before our start date or after the horizon
+            if event_date < base_date or event_date >= end_date:
                 continue
 
             starts_at = datetime.combine(
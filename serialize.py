@@ -0,0 +1,91 @@
+import json
+from collections.abc import Iterable
+from dataclasses import fields
+from functools import cache
+from json.encoder import encode_basestring_ascii
+
+from event import DanceEvent
+
+# json.dump calls back into Python (`default=`) for every datetime and every
+# event, and with `indent` it can't use its C encoder at all. Events are flat
+# and their fields known, so we encode them ourselves: every value goes
+# through the C string encoder (or str for numbers) into a template that is
+# built once, and the pretty printed form is exactly what
+# `json.dump(..., indent=2)` writes.
+
+FIELDS = ["key"] + [f.name for f in fields(DanceEvent)]
+
+_string = encode_basestring_ascii
+
+
+def _optional(value: str | None) -> str:
+    return "null" if value is None else _string(value)
+
+
+def _values(event: DanceEvent) -> tuple[str, ...]:
+    # Same order as FIELDS.
+    return (
+        _string(event.key),
+        _string(event.starts_at.isoformat()),
+        _string(event.name),
+        "null" if event.price_euro_cent is None else str(event.price_euro_cent),
+        _string(event.description),
+        _string(event.dancing_school),
+        _string(event.website),
+        "null" if event.ends_at is None else _string(event.ends_at.isoformat()),
+        _optional(event.recurrence),
+    )
+
+
+@cache
+def _template(compact: bool, level: int) -> str:
+    names = [_string(name).replace("%", "%%") for name in FIELDS]
+    if compact:
+        return "{" + ",".join(f"{name}:%s" for name in names) + "}"
+
+    outer = "  " * level
+    inner = outer + "  "
+    return (
+        outer
+        + "{\n"
+        + ",\n".join(f"{inner}{name}: %s" for name in names)
+        + f"\n{outer}}}"
+    )
+
+
+# Compact, or pretty printed as an element of a list nested `level` deep.
+def encode_event(event: DanceEvent, compact: bool = False, level: int = 2) -> str:
+    return _template(compact, level) % _values(event)
+
+
+# A JSON object with `header` and the events in a list under `name`.
+def encode_document(
+    header: dict, events: list[DanceEvent], compact: bool = False, name="events"
+) -> str:
+    fragments = [encode_event(e, compact=compact) for e in events]
+    return encode_fragments(header, fragments, compact, name)
+
+
+# Same as encode_document, but with events that are encoded already (by
+# encode_event, pretty printed with the default level), so that an event in
+# several documents is only encoded once.
+def encode_fragments(
+    header: dict, fragments: list[str], compact: bool = False, name="events"
+) -> str:
+    if compact:
+        text = json.dumps(header | {name: []}, separators=(",", ":"))
+    else:
+        text = json.dumps(header | {name: []}, indent=2)
+    if not fragments:
+        return text
+
+    head, tail = text.rsplit("[]", 1)
+    if compact:
+        return f"{head}[{','.join(fragments)}]{tail}"
+    return f"{head}[\n{',\n'.join(fragments)}\n  ]{tail}"
+
+
+# One event per line, so that consumers can stream and parse it line by line.
+def encode_ndjson(events: Iterable[DanceEvent]) -> Iterable[str]:
+    for event in events:
+        yield encode_event(event, compact=True) + "\n"
@@ -0,0 +1,69 @@
+import os
+import pickle
+import re
+from datetime import datetime
+
+from event import DanceEvent
+
+# The last successful result of every source is kept on disk, so that if a
+# source fails (or is too slow) we can still show its events from the last
+# time instead of dropping the whole school until the next run.
+
+_folder: str | None = None
+
+
+def configure(folder: str):
+    global _folder
+
+    _folder = folder
+    os.makedirs(os.path.join(folder, "sources"), exist_ok=True)
+
+
+def _write(path: str, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _read(path: str):
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+        return None
+
+
+def _source_path(name: str) -> str:
+    slug = re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-")
+    return os.path.join(_folder, "sources", slug + ".pickle")
+
+
+def save_source(name: str, events: list[DanceEvent]):
+    if _folder is None:
+        return
+
+    _write(_source_path(name), (datetime.now(), events))
+
+
+def load_source(name: str) -> tuple[datetime, list[DanceEvent]] | None:
+    if _folder is None:
+        return None
+
+    return _read(_source_path(name))
+
+
+# The outputs of the last crawl can be rendered again right away after a
+# restart, long before the first new crawl is done.
+def save_crawl(events: list[DanceEvent], metadata: dict):
+    if _folder is None:
+        return
+
+    _write(os.path.join(_folder, "crawl.pickle"), (events, metadata))
+
+
+def load_crawl() -> tuple[list[DanceEvent], dict] | None:
+    if _folder is None:
+        return None
+
+    return _read(os.path.join(_folder, "crawl.pickle"))
@@ -0,0 +1,47 @@
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+# Everything that is imported when main.py starts has to be paid on every
+# run, so heavy dependencies (dateparser, bs4, icalendar, jinja2) are only
+# imported in the functions that need them. This report makes it easy to
+# spot when one sneaks back to the top level.
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def measure(module: str = "main") -> dict[str, int]:
+    # Import times are only meaningful in a fresh interpreter.
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    # Sum up the time spent in each module itself per top level package.
+    packages: dict[str, int] = defaultdict(int)
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match is None:
+            continue
+        self_us, _, _, name = match.groups()
+        packages[name.split(".")[0]] += int(self_us)
+
+    return dict(packages)
+
+
+def report(budget_ms: float | None = None, top: int = 20) -> int:
+    packages = measure()
+    total_ms = sum(packages.values()) / 1000
+
+    print(f"{'module':<24} {'ms':>8}")
+    for name, us in sorted(packages.items(), key=lambda p: -p[1])[:top]:
+        print(f"{name:<24} {us / 1000:>8.1f}")
+    print(f"{'total':<24} {total_ms:>8.1f}")
+
+    if budget_ms is not None and total_ms > budget_ms:
+        print(f"🔥 Startup takes {total_ms:.0f}ms, the budget is {budget_ms:.0f}ms")
+        return 1
+    return 0
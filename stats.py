@@ -0,0 +1,40 @@
+import threading
+from collections import Counter
+from collections.abc import Callable
+from typing import Any
+
+# Counters that are collected while crawling (cache hits, skipped requests,
+# ...) and end up in the metadata of each run. Downloaders run concurrently,
+# so all access goes through a lock.
+_counter: Counter[str] = Counter()
+_lock = threading.Lock()
+
+
+def incr(name: str, n: int = 1):
+    with _lock:
+        _counter[name] += n
+
+
+def snapshot() -> dict[str, int]:
+    with _lock:
+        return dict(sorted(_counter.items()))
+
+
+def reset():
+    with _lock:
+        _counter.clear()
+
+
+# Counters incremented in another process would be lost, so a function run
+# there goes through `collect`, which returns its result together with the
+# counters it incremented, and the caller `merge`s them. A worker process
+# only runs one function at a time.
+def collect(fn: Callable, *args) -> tuple[Any, dict[str, int]]:
+    reset()
+    result = fn(*args)
+    return result, snapshot()
+
+
+def merge(counters: dict[str, int]):
+    with _lock:
+        _counter.update(counters)
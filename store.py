@@ -0,0 +1,286 @@
+import hashlib
+import sqlite3
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from event import DanceEvent
+
+# Every crawl is recorded in a SQLite database, so that we have a history of
+# the events and the outputs can be read with indexed queries.
+# An event row is valid from the crawl that added it (added_in) until the
+# crawl that removed or changed it (removed_in, NULL while it is current). A
+# changed event gets a new row, so a crawl only writes the rows that actually
+# changed, no matter how many events there are.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS crawls (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    crawled_at TEXT NOT NULL,
+    event_count INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    starts_at TEXT NOT NULL,
+    ends_at TEXT,
+    name TEXT NOT NULL,
+    price_euro_cent INTEGER,
+    description TEXT NOT NULL,
+    dancing_school TEXT NOT NULL,
+    website TEXT NOT NULL,
+    recurrence TEXT,
+    added_in INTEGER NOT NULL REFERENCES crawls (id),
+    removed_in INTEGER REFERENCES crawls (id)
+);
+
+CREATE TABLE IF NOT EXISTS series_revisions (
+    uid TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    sequence INTEGER NOT NULL,
+    changed_at TEXT NOT NULL
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS events_current_key
+    ON events (key) WHERE removed_in IS NULL;
+CREATE INDEX IF NOT EXISTS events_current_starts_at
+    ON events (starts_at) WHERE removed_in IS NULL;
+CREATE INDEX IF NOT EXISTS events_current_school
+    ON events (dancing_school, starts_at) WHERE removed_in IS NULL;
+CREATE INDEX IF NOT EXISTS events_key ON events (key);
+CREATE INDEX IF NOT EXISTS events_added_in ON events (added_in);
+CREATE INDEX IF NOT EXISTS events_removed_in ON events (removed_in);
+"""
+
+COLUMNS = [
+    "starts_at",
+    "ends_at",
+    "name",
+    "price_euro_cent",
+    "description",
+    "dancing_school",
+    "website",
+    "recurrence",
+]
+
+_db: sqlite3.Connection | None = None
+
+
+@dataclass
+class Changes:
+    seq: int
+    crawled_at: datetime
+    added: list[DanceEvent] = field(default_factory=list)
+    modified: list[DanceEvent] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)
+
+
+# Without a path the store only lives in memory, which is enough to read the
+# outputs from but keeps no history.
+def configure(path: str = ":memory:"):
+    global _db
+
+    if _db is not None:
+        _db.close()
+
+    _db = sqlite3.connect(path)
+    _db.execute("PRAGMA journal_mode = WAL")
+    _db.executescript(SCHEMA)
+
+    # Databases from before events had a recurrence.
+    columns = {row[1] for row in _db.execute("PRAGMA table_info(events)")}
+    if "recurrence" not in columns:
+        _db.execute("ALTER TABLE events ADD COLUMN recurrence TEXT")
+
+
+def _connection() -> sqlite3.Connection:
+    if _db is None:
+        configure()
+    return _db
+
+
+def content_hash(event: DanceEvent) -> str:
+    values = [getattr(event, column) for column in COLUMNS]
+    return hashlib.sha1(repr(values).encode()).hexdigest()
+
+
+def _to_row(event: DanceEvent) -> list:
+    return [
+        event.starts_at.isoformat(),
+        event.ends_at.isoformat() if event.ends_at is not None else None,
+        event.name,
+        event.price_euro_cent,
+        event.description,
+        event.dancing_school,
+        event.website,
+        event.recurrence,
+    ]
+
+
+def _from_row(row: tuple) -> DanceEvent:
+    starts_at, ends_at, name, price, description, school, website, recurrence = row
+    return DanceEvent(
+        starts_at=datetime.fromisoformat(starts_at),
+        ends_at=datetime.fromisoformat(ends_at) if ends_at is not None else None,
+        name=name,
+        price_euro_cent=price,
+        description=description,
+        dancing_school=school,
+        website=website,
+        recurrence=recurrence,
+    )
+
+
+# Records the events of a crawl and returns the id of the crawl. Recording
+# the same crawl again (e.g. on a warm start) does nothing.
+def record_crawl(events: list[DanceEvent], crawled_at: datetime) -> int:
+    db = _connection()
+
+    last = db.execute(
+        "SELECT id FROM crawls WHERE crawled_at = ? ORDER BY id DESC LIMIT 1",
+        [crawled_at.isoformat()],
+    ).fetchone()
+    if last is not None:
+        return last[0]
+
+    # Events with the same key are the same event (e.g. listed twice by the
+    # school), so only the first one is kept.
+    new: dict[str, DanceEvent] = {}
+    for event in events:
+        new.setdefault(event.key, event)
+    hashes = {key: content_hash(event) for key, event in new.items()}
+
+    current = dict(db.execute("SELECT key, hash FROM events WHERE removed_in IS NULL"))
+    outdated = [key for key, hash in current.items() if hashes.get(key) != hash]
+    added = [key for key, hash in hashes.items() if current.get(key) != hash]
+
+    with db:
+        crawl_id = db.execute(
+            "INSERT INTO crawls (crawled_at, event_count) VALUES (?, ?)",
+            [crawled_at.isoformat(), len(new)],
+        ).lastrowid
+        db.executemany(
+            "UPDATE events SET removed_in = ? WHERE key = ? AND removed_in IS NULL",
+            [(crawl_id, key) for key in outdated],
+        )
+        db.executemany(
+            f"INSERT INTO events (key, hash, {', '.join(COLUMNS)}, added_in) "
+            f"VALUES (?, ?, {', '.join('?' * len(COLUMNS))}, ?)",
+            [[key, hashes[key], *_to_row(new[key]), crawl_id] for key in added],
+        )
+
+    return crawl_id
+
+
+# The current events starting in [start, end), ordered by their start.
+def events(
+    start: datetime | None = None,
+    end: datetime | None = None,
+    school: str | None = None,
+) -> list[DanceEvent]:
+    conditions = ["removed_in IS NULL"]
+    parameters = []
+    if start is not None:
+        conditions.append("starts_at >= ?")
+        parameters.append(start.isoformat())
+    if end is not None:
+        conditions.append("starts_at < ?")
+        parameters.append(end.isoformat())
+    if school is not None:
+        conditions.append("dancing_school = ?")
+        parameters.append(school)
+
+    rows = _connection().execute(
+        f"SELECT {', '.join(COLUMNS)} FROM events "
+        f"WHERE {' AND '.join(conditions)} "
+        "ORDER BY starts_at, dancing_school, name",
+        parameters,
+    )
+    return [_from_row(row) for row in rows]
+
+
+# For every current event, when it was last added or changed and how many
+# versions of it there have been.
+def versions() -> dict[str, tuple[datetime, int]]:
+    rows = _connection().execute(
+        "SELECT key, max(crawls.crawled_at), count(*) FROM events "
+        "JOIN crawls ON crawls.id = events.added_in "
+        "WHERE key IN (SELECT key FROM events WHERE removed_in IS NULL) "
+        "GROUP BY key"
+    )
+    return {
+        key: (datetime.fromisoformat(crawled_at), count)
+        for key, crawled_at, count in rows
+    }
+
+
+# When a recurring series in the calendar last changed and its SEQUENCE,
+# which has to go up whenever what we write for it (its `fingerprint`)
+# changes. `sequence` is the lowest one to use.
+def series_revision(
+    uid: str, fingerprint: str, changed_at: datetime, sequence: int = 0
+) -> tuple[datetime, int]:
+    db = _connection()
+    row = db.execute(
+        "SELECT fingerprint, sequence, changed_at FROM series_revisions WHERE uid = ?",
+        [uid],
+    ).fetchone()
+    if row is not None:
+        last_fingerprint, last_sequence, last_changed_at = row
+        last_changed_at = datetime.fromisoformat(last_changed_at)
+        if last_fingerprint == fingerprint:
+            return last_changed_at, last_sequence
+        sequence = max(sequence, last_sequence + 1)
+        changed_at = max(changed_at, last_changed_at)
+
+    with db:
+        db.execute(
+            "INSERT OR REPLACE INTO series_revisions VALUES (?, ?, ?, ?)",
+            [uid, fingerprint, sequence, changed_at.isoformat()],
+        )
+    return changed_at, sequence
+
+
+def first_crawl() -> int:
+    return _connection().execute("SELECT min(id) FROM crawls").fetchone()[0] or 0
+
+
+def last_crawl() -> int:
+    return _connection().execute("SELECT max(id) FROM crawls").fetchone()[0] or 0
+
+
+# What every crawl after `since` changed, oldest first. Crawls that didn't
+# change anything are left out.
+# A changed event shows up as the removal of its old row and the addition of
+# a new row with the same key in the same crawl.
+def changes(since: int) -> list[Changes]:
+    db = _connection()
+    crawls = {
+        crawl_id: Changes(seq=crawl_id, crawled_at=datetime.fromisoformat(crawled_at))
+        for crawl_id, crawled_at in db.execute(
+            "SELECT id, crawled_at FROM crawls WHERE id > ? ORDER BY id", [since]
+        )
+    }
+
+    added: dict[int, dict[str, DanceEvent]] = {crawl_id: {} for crawl_id in crawls}
+    removed: dict[int, set[str]] = {crawl_id: set() for crawl_id in crawls}
+    rows = db.execute(
+        f"SELECT key, added_in, removed_in, {', '.join(COLUMNS)} FROM events "
+        "WHERE added_in > ? OR removed_in > ? ORDER BY starts_at, dancing_school, name",
+        [since, since],
+    )
+    for key, added_in, removed_in, *row in rows:
+        if added_in in added:
+            added[added_in][key] = _from_row(row)
+        if removed_in in removed:
+            removed[removed_in].add(key)
+
+    for crawl_id, change in crawls.items():
+        for key, event in added[crawl_id].items():
+            if key in removed[crawl_id]:
+                change.modified.append(event)
+            else:
+                change.added.append(event)
+        change.removed = sorted(removed[crawl_id] - added[crawl_id].keys())
+
+    return [c for c in crawls.values() if c.added or c.modified or c.removed]
@@ -1,4 +1,4 @@
-import dateparser
+from datetime import datetime, time
 
 from event import DanceEvent
 from timeutil import Weekday, remove_events_between, weekly_event
@@ -15,8 +15,8 @@ def create_perfections() -> list[DanceEvent]:
     events += weekly_event(
         Weekday.SUN,
         DanceEvent(
-            starts_at=dateparser.parse("19:00"),
-            ends_at=dateparser.parse("21:30"),
+            starts_at=time(19, 0),
+            ends_at=time(21, 30),
             name="Perfektion",
             price_euro_cent=550,
             description="keine Anmeldung erforderlich.",
@@ -28,8 +28,8 @@ def create_perfections() -> list[DanceEvent]:
     events += weekly_event(
         Weekday.WED,
         DanceEvent(
-            starts_at=dateparser.parse("20:00"),
-            ends_at=dateparser.parse("22:00"),
+            starts_at=time(20, 0),
+            ends_at=time(22, 0),
             name="Perfektion mit Karina",
             price_euro_cent=550,
             description="keine Anmeldung erforderlich.",
@@ -40,8 +40,8 @@ def create_perfections() -> list[DanceEvent]:
 
     # No events in the semester holidays
     events = remove_events_between(
-        dateparser.parse("2024-02-04 00:00"),
-        dateparser.parse("2024-02-11 23:59"),
+        datetime(2024, 2, 4, 0, 0),
+        datetime(2024, 2, 11, 23, 59),
         events,
     )
 
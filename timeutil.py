@@ -1,7 +1,9 @@
+import math
 from dataclasses import replace
 from datetime import datetime, timedelta
 from enum import Enum
 
+import horizon
 from event import DanceEvent
 from holiday import holidays
 
@@ -15,6 +17,11 @@ class Weekday(Enum):
     SAT = 5
     SUN = 6
 
+    # The day as written in iCalendar rules (BYDAY).
+    @property
+    def ical(self) -> str:
+        return ["MO", "TU", "WE", "TH", "FR", "SA", "SU"][self.value]
+
 
 def remove_events_between(
     start: datetime, end: datetime, events: list[DanceEvent]
@@ -30,19 +37,30 @@ def weekly_event(
 ) -> list[DanceEvent]:
     events = []
 
-    for date in repeat_weekly(next_weekday(day), 9):
+    # Handle both list and single integer inputs
+    if isinstance(weeks_of_month, int):
+        weeks_of_month = [weeks_of_month]
+
+    # Every event remembers the rule it was created from, so that calendars
+    # can get the whole series as one event. Skipped holidays are left out of
+    # the rule, they become EXDATEs when the series is written.
+    if weeks_of_month is None:
+        recurrence = f"FREQ=WEEKLY;BYDAY={day.ical}"
+    else:
+        recurrence = "FREQ=MONTHLY;BYDAY=" + ",".join(
+            f"{week}{day.ical}" for week in weeks_of_month
+        )
+
+    # Repeat until the horizon
+    start = next_weekday(day)
+    weeks = math.ceil((horizon.end() - start) / timedelta(weeks=1))
+    for date in repeat_weekly(start, weeks):
         if exclude_holiday and date.date() in holidays():
             continue
 
         # Skip if weeks_of_month is specified and doesn't match
-        if weeks_of_month is not None:
-            current_week = (date.day - 1) // 7 + 1
-            # Handle both list and single integer inputs
-            weeks = (
-                [weeks_of_month] if isinstance(weeks_of_month, int) else weeks_of_month
-            )
-            if current_week not in weeks:
-                continue
+        if weeks_of_month is not None and week_of_month(date) not in weeks_of_month:
+            continue
 
         event = replace(
             template,
@@ -52,12 +70,59 @@ def weekly_event(
             ends_at=date.replace(
                 hour=template.ends_at.hour, minute=template.ends_at.minute
             ),
+            recurrence=recurrence,
         )
         events.append(event)
 
     return events
 
 
+def week_of_month(date: datetime) -> int:
+    return (date.day - 1) // 7 + 1
+
+
+# The dates a rule created by weekly_event produces, from the first event of
+# the series up to and including the last one.
+def recurrence_dates(
+    recurrence: str, first: datetime, last: datetime
+) -> list[datetime]:
+    parts = dict(part.split("=") for part in recurrence.split(";"))
+    weeks_of_month = None
+    if parts["FREQ"] == "MONTHLY":
+        weeks_of_month = {int(day[:-2]) for day in parts["BYDAY"].split(",")}
+
+    weeks = (last - first) // timedelta(weeks=1) + 1
+    return [
+        date
+        for date in repeat_weekly(first, weeks)
+        if weeks_of_month is None or week_of_month(date) in weeks_of_month
+    ]
+
+
+# Groups the events of the same series (same rule, school, name, time and
+# details), in the order of their first events. Events without a rule are a
+# series of their own.
+def group_series(events: list[DanceEvent]) -> list[list[DanceEvent]]:
+    series: dict[tuple, list[DanceEvent]] = {}
+    for event in events:
+        if event.recurrence is None:
+            series[(id(event),)] = [event]
+            continue
+
+        identity = (
+            event.recurrence,
+            event.dancing_school,
+            event.name,
+            event.price_euro_cent,
+            event.description,
+            event.website,
+            event.starts_at.time(),
+            event.ends_at - event.starts_at if event.ends_at is not None else None,
+        )
+        series.setdefault(identity, []).append(event)
+    return list(series.values())
+
+
 def repeat_weekly(date: datetime, n: int) -> list[datetime]:
     return [date + timedelta(weeks=i) for i in range(n)]
 